@@ -0,0 +1,162 @@
+import hmac
+import os
+import time
+from typing import Iterable, List
+
+from fastapi import Header, HTTPException
+from sqlalchemy import bindparam, select
+from sqlalchemy.engine import Engine
+
+from changefeed import get_catalog_version
+from models import FoodItem
+from schemas import FoodItemCreate
+from tenants import DEFAULT_TENANT
+
+# Admin endpoints are disabled unless a token is configured
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+# Rows per executemany call in bulk writes
+BULK_CHUNK_SIZE = int(os.getenv("ADMIN_BULK_CHUNK_SIZE", "500"))
+
+FOOD_COLUMNS = [
+    "name", "emoji", "cuisine", "tags", "avg_price", "description",
+    "spice_level", "is_vegetarian", "serving_size", "temperature", "claims",
+]
+
+
+def require_admin(x_admin_token: str = Header(None)):
+    """Dependency that guards admin endpoints with the ADMIN_TOKEN header"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=403, detail="Admin API is disabled. Set ADMIN_TOKEN to enable it.")
+    if x_admin_token is None or not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=401, detail="Invalid admin token")
+
+
+def food_row(item: FoodItemCreate) -> dict:
+    """Column values for a FoodItem insert/update"""
+    row = item.model_dump(include=set(FOOD_COLUMNS))
+    row["cuisine"] = row["cuisine"].lower()
+    row["is_vegetarian"] = int(row["is_vegetarian"])
+    return row
+
+
+def chunked(items: List, size: int) -> Iterable[List]:
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def bulk_upsert(
+    engine: Engine, items: List[FoodItemCreate], tenant: str = DEFAULT_TENANT, chunk_size: int = BULK_CHUNK_SIZE
+) -> dict:
+    """Insert or update a tenant's food items in a single transaction, chunk by chunk.
+
+    Items carrying an id that already exists are updated, everything else is
+    inserted. Each chunk issues at most one executemany per statement.
+    An id repeated in the payload is written once, with its last occurrence.
+    Ids owned by another tenant abort the whole write with a 409.
+    """
+    last = {item.id: index for index, item in enumerate(items) if item.id is not None}
+    items = [item for index, item in enumerate(items) if item.id is None or last[item.id] == index]
+
+    table = FoodItem.__table__
+    update_stmt = (
+        table.update()
+        .where(table.c.id == bindparam("_id"))
+        .values({column: bindparam(column) for column in FOOD_COLUMNS})
+    )
+
+    inserted = updated = 0
+    chunks = []
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        for index, chunk in enumerate(chunked(items, chunk_size)):
+            chunk_started = time.perf_counter()
+
+            ids = [item.id for item in chunk if item.id is not None]
+            existing = set()
+            if ids:
+                owners = dict(conn.execute(select(table.c.id, table.c.tenant).where(table.c.id.in_(ids))).all())
+                foreign = sorted(food_id for food_id, owner in owners.items() if owner != tenant)
+                if foreign:
+                    raise HTTPException(
+                        status_code=409,
+                        detail=f"Food items belong to another tenant: {', '.join(map(str, foreign[:20]))}"
+                    )
+                existing = set(owners)
+
+            updates, inserts = [], []
+            for item in chunk:
+                row = food_row(item)
+                if item.id in existing:
+                    row["_id"] = item.id
+                    updates.append(row)
+                else:
+                    if item.id is not None:
+                        row["id"] = item.id
+                    row["tenant"] = tenant
+                    inserts.append(row)
+
+            if updates:
+                conn.execute(update_stmt, updates)
+            if inserts:
+                # Rows with and without explicit ids need separate executemany batches
+                with_id = [row for row in inserts if "id" in row]
+                without_id = [row for row in inserts if "id" not in row]
+                if with_id:
+                    conn.execute(table.insert(), with_id)
+                if without_id:
+                    conn.execute(table.insert(), without_id)
+
+            inserted += len(inserts)
+            updated += len(updates)
+            chunks.append({
+                "chunk": index,
+                "rows": len(chunk),
+                "ms": round((time.perf_counter() - chunk_started) * 1000, 2),
+            })
+
+        version = get_catalog_version(conn)
+
+    return {
+        "inserted": inserted,
+        "updated": updated,
+        "deleted": 0,
+        "catalog_version": version,
+        "chunks": chunks,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
+
+
+def bulk_delete(
+    engine: Engine, ids: List[int], tenant: str = DEFAULT_TENANT, chunk_size: int = BULK_CHUNK_SIZE
+) -> dict:
+    """Delete a tenant's food items by id in a single transaction, chunk by chunk"""
+    table = FoodItem.__table__
+    delete_stmt = table.delete().where(table.c.id == bindparam("_id"), table.c.tenant == tenant)
+
+    deleted = 0
+    chunks = []
+    started = time.perf_counter()
+
+    with engine.begin() as conn:
+        for index, chunk in enumerate(chunked(ids, chunk_size)):
+            chunk_started = time.perf_counter()
+            result = conn.execute(delete_stmt, [{"_id": food_id} for food_id in chunk])
+            deleted += result.rowcount
+            chunks.append({
+                "chunk": index,
+                "rows": len(chunk),
+                "ms": round((time.perf_counter() - chunk_started) * 1000, 2),
+            })
+
+        version = get_catalog_version(conn)
+
+    return {
+        "inserted": 0,
+        "updated": 0,
+        "deleted": deleted,
+        "catalog_version": version,
+        "chunks": chunks,
+        "total_ms": round((time.perf_counter() - started) * 1000, 2),
+    }
@@ -0,0 +1,160 @@
+"""Benchmark /api/recommend and /api/foods in-process: latency and payload size per mode.
+
+Usage: python bench_recommend.py [--requests N]
+
+Runs the endpoint functions against the local database and serializes the
+result through the response model, the same work FastAPI does per request.
+Wire sizes are what CompressionMiddleware would send for gzip and br.
+The response cache is bypassed except in the cache-tier section, which
+measures cold (miss), after-restart (shared tier) and warm (memory) hits.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from typing import List
+
+from fastapi import Response
+from pydantic import TypeAdapter
+
+import main as api
+
+from compression import COMPRESSION_MIN_SIZE, brotli, compress
+from context import request_context
+from database import SessionLocal
+from main import get_all_foods, get_recommendation
+from reccache import RecommendationCache
+from recommendation import get_recommendations, quiz_bucket_index
+from schemas import DietaryFilters, FoodItemResponse, QuizAnswers, RecommendationResponse
+from tenants import DEFAULT_TENANT
+
+FOOD_LIST = TypeAdapter(List[FoodItemResponse])
+
+
+def random_answers(rng: random.Random) -> QuizAnswers:
+    return QuizAnswers(
+        hunger=rng.randint(0, 100),
+        budget=rng.choice(["broke", "moderate", "balling"]),
+        healthiness=rng.randint(0, 100),
+        temperature=rng.randint(0, 100),
+        spice=rng.randint(0, 5),
+        social=rng.choice(["solo", "date", "group"]),
+        vibe=rng.choice(["hangover", "stressed", "lazy", "happy"]),
+    )
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def wire_size(body: bytes, encoding: str) -> int:
+    if len(body) < COMPRESSION_MIN_SIZE:
+        return len(body)
+    return len(compress(body, encoding))
+
+
+def measure(label: str, calls, sizes: bool = True):
+    """Time each call (endpoint + serialization) and report latency and sizes"""
+    calls[0]()  # warm up the catalog snapshot before timing
+
+    latencies, bodies = [], []
+    for call in calls:
+        started = time.perf_counter()
+        body = call()
+        latencies.append((time.perf_counter() - started) * 1000)
+        bodies.append(body)
+
+    line = (
+        f"  {label:<32} p50 {statistics.median(latencies):7.3f} ms  "
+        f"p99 {percentile(latencies, 99):7.3f} ms"
+    )
+    if not sizes:
+        print(line)
+        return
+
+    sample = bodies[:200]
+    line += (
+        f"  raw {statistics.mean(len(body) for body in bodies):7.0f} B  "
+        f"gzip {statistics.mean(wire_size(body, 'gzip') for body in sample):6.0f} B"
+    )
+    if brotli is not None:
+        line += f"  br {statistics.mean(wire_size(body, 'br') for body in sample):6.0f} B"
+    print(line)
+
+
+def recommend_call(db, quiz, **params):
+    def call():
+        result = get_recommendation(quiz, db=db, x_timezone=None, tenant=DEFAULT_TENANT, **params)
+        if isinstance(result, Response):
+            return result.body
+        return RecommendationResponse.model_validate(result).model_dump_json().encode()
+    return call
+
+
+def scoring_call(db, quiz, context):
+    def call():
+        return get_recommendations(db, quiz, limit=3, context=context)
+    return call
+
+
+def foods_call(db, **params):
+    def call():
+        result = get_all_foods(db=db, cuisine=None, filters=DietaryFilters(), tenant=DEFAULT_TENANT, **params)
+        if isinstance(result, Response):
+            return result.body
+        return FOOD_LIST.dump_json(FOOD_LIST.validate_python(result, from_attributes=True))
+    return call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=2000, help="requests per mode")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    answers = [random_answers(rng) for _ in range(args.requests)]
+
+    db = SessionLocal()
+    try:
+        # No caching: every call scores and serializes
+        api.recommendation_cache = RecommendationCache(maxsize=0, shared_url="")
+        print(f"/api/recommend ({args.requests} requests per mode)")
+        for label, params in [
+            ("explain=false", {"explain": False}),
+            ("explain=true", {"explain": True}),
+            ("fields=id,name,emoji", {"explain": False, "fields": "id,name,emoji"}),
+        ]:
+            measure(label, [recommend_call(db, quiz, **params) for quiz in answers])
+
+        print(f"get_recommendations scoring loop ({args.requests} calls per mode)")
+        context = request_context()
+        for label, value in [("context off", 0), ("context on", context)]:
+            measure(label, [scoring_call(db, quiz, value) for quiz in answers], sizes=False)
+
+        print(f"/api/foods?limit=50 ({args.requests} requests per mode)")
+        for label, params in [
+            ("all fields", {"limit": 50, "fields": None}),
+            ("fields=id,name,emoji,avg_price", {"limit": 50, "fields": "id,name,emoji,avg_price"}),
+        ]:
+            measure(label, [foods_call(db, **params)] * args.requests)
+
+        # One request per distinct quiz bucket so the cold phase never hits
+        distinct = list({quiz_bucket_index(quiz): quiz for quiz in answers}.values())
+        print(f"/api/recommend cache tiers ({len(distinct)} distinct quiz buckets per phase)")
+        with tempfile.TemporaryDirectory() as tmp:
+            shared_url = f"sqlite:///{os.path.join(tmp, 'rec_cache.db')}"
+            api.recommendation_cache = RecommendationCache(shared_url=shared_url)
+            measure("cold (miss, compute + store)", [recommend_call(db, quiz) for quiz in distinct], sizes=False)
+            # A restarted worker: empty memory tier, same shared file
+            api.recommendation_cache = RecommendationCache(shared_url=shared_url)
+            measure("after restart (shared tier)", [recommend_call(db, quiz) for quiz in distinct], sizes=False)
+            measure("warm (memory tier)", [recommend_call(db, quiz) for quiz in distinct], sizes=False)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""Microbenchmark: quiz tag generation and tag matching, before vs after interning.
+
+Usage: python bench_tags.py [--number N]
+
+"Before" is the original if/elif quiz_to_tags and the set-of-lowered-strings
+calculate_match_score, reproduced here verbatim. "After" is the compiled
+QUIZ_TABLE lookup and the bitmask/popcount scoring used by get_recommendations.
+"""
+import argparse
+import random
+import timeit
+from typing import List, Tuple
+
+from recommendation import compile_quiz, quiz_to_tags
+from schemas import QuizAnswers
+from seed_data import FOOD_ITEMS
+from vocabulary import vocabulary
+
+
+def legacy_quiz_to_tags(answers: QuizAnswers) -> List[str]:
+    """Convert quiz answers to searchable tags"""
+    tags = []
+    
+    # Hunger level (0-100)
+    if answers.hunger < 33:
+        tags.append("hunger_low")
+        tags.append("light")
+        tags.append("snack")
+    elif answers.hunger < 66:
+        tags.append("hunger_medium")
+        tags.append("regular")
+    else:
+        tags.append("hunger_high")
+        tags.append("filling")
+        tags.append("heavy")
+    
+    # Budget
+    if answers.budget == "broke":
+        tags.append("budget_low")
+        tags.append("cheap")
+        tags.append("affordable")
+    elif answers.budget == "moderate":
+        tags.append("budget_medium")
+        tags.append("moderate_price")
+    else:  # balling
+        tags.append("budget_high")
+        tags.append("premium")
+        tags.append("expensive")
+    
+    # Healthiness (0-100, lower = healthier)
+    if answers.healthiness < 40:
+        tags.append("healthy")
+        tags.append("nutritious")
+        tags.append("light")
+    elif answers.healthiness > 60:
+        tags.append("indulgent")
+        tags.append("comfort")
+        tags.append("rich")
+    else:
+        tags.append("balanced")
+    
+    # Temperature preference (0-100, lower = cold)
+    if answers.temperature < 40:
+        tags.append("cold")
+        tags.append("chilled")
+        tags.append("refreshing")
+    elif answers.temperature > 60:
+        tags.append("hot")
+        tags.append("warm")
+        tags.append("steaming")
+    else:
+        tags.append("room_temp")
+    
+    # Spice level (0-5)
+    if answers.spice == 0:
+        tags.append("spice_none")
+        tags.append("mild")
+        tags.append("no_spice")
+    elif answers.spice <= 2:
+        tags.append("spice_mild")
+        tags.append("slightly_spicy")
+    elif answers.spice <= 4:
+        tags.append("spice_medium")
+        tags.append("spicy")
+    else:  # 5
+        tags.append("spice_hot")
+        tags.append("very_spicy")
+        tags.append("fiery")
+    
+    # Social setting
+    if answers.social == "solo":
+        tags.append("solo")
+        tags.append("single_serving")
+        tags.append("quick")
+    elif answers.social == "date":
+        tags.append("date")
+        tags.append("romantic")
+        tags.append("shareable")
+    else:  # group
+        tags.append("group")
+        tags.append("shareable")
+        tags.append("party")
+        tags.append("family")
+    
+    # Vibe/Mood
+    if answers.vibe == "hangover":
+        tags.append("hangover")
+        tags.append("comfort")
+        tags.append("greasy")
+        tags.append("carbs")
+        tags.append("recovery")
+    elif answers.vibe == "stressed":
+        tags.append("stressed")
+        tags.append("comfort")
+        tags.append("quick")
+        tags.append("easy")
+    elif answers.vibe == "lazy":
+        tags.append("lazy")
+        tags.append("easy")
+        tags.append("delivery")
+        tags.append("no_effort")
+    else:  # happy
+        tags.append("happy")
+        tags.append("celebratory")
+        tags.append("treat")
+        tags.append("special")
+    
+    return tags
+
+
+
+def legacy_match_score(food_tags: List[str], user_tags: List[str]) -> Tuple[float, List[str]]:
+    """Calculate how well a food item matches user preferences"""
+    food_tags_set = set(tag.lower() for tag in food_tags)
+    user_tags_set = set(tag.lower() for tag in user_tags)
+    
+    # Find matching tags
+    matched_tags = list(food_tags_set.intersection(user_tags_set))
+    
+    # Calculate score (percentage of user tags matched + bonus for food-specific matches)
+    if len(user_tags_set) == 0:
+        return 0.0, []
+    
+    # Base score from matched tags
+    base_score = len(matched_tags) / len(user_tags_set) * 100
+    
+    # Bonus for having more specific matches
+    bonus = len(matched_tags) * 2
+    
+    final_score = min(base_score + bonus, 100)
+    
+    return round(final_score, 1), matched_tags
+
+
+
+def random_answers(rng: random.Random) -> QuizAnswers:
+    return QuizAnswers(
+        hunger=rng.randint(0, 100),
+        budget=rng.choice(["broke", "moderate", "balling"]),
+        healthiness=rng.randint(0, 100),
+        temperature=rng.randint(0, 100),
+        spice=rng.randint(0, 5),
+        social=rng.choice(["solo", "date", "group"]),
+        vibe=rng.choice(["hangover", "stressed", "lazy", "happy"]),
+    )
+
+
+def report(label: str, seconds: float, calls: int):
+    print(f"  {label:<34} {seconds / calls * 1e9:>10.0f} ns/call")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--number", type=int, default=20000, help="calls per measurement")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    answers = [random_answers(rng) for _ in range(256)]
+    food_tags = [item["tags"] for item in FOOD_ITEMS]
+    food_masks = [vocabulary.mask(tags) for tags in food_tags]
+    n = args.number
+
+    def cycle(values):
+        i = 0
+        while True:
+            yield values[i % len(values)]
+            i += 1
+
+    print("Tag generation")
+    it = cycle(answers)
+    report("before: if/elif quiz_to_tags", timeit.timeit(lambda: legacy_quiz_to_tags(next(it)), number=n), n)
+    it = cycle(answers)
+    report("after: quiz_to_tags (list copy)", timeit.timeit(lambda: quiz_to_tags(next(it)), number=n), n)
+    it = cycle(answers)
+    report("after: compile_quiz (table entry)", timeit.timeit(lambda: compile_quiz(next(it)), number=n), n)
+
+    print(f"Matching (one food item, averaged over {len(food_tags)} catalog items)")
+    user_tags = legacy_quiz_to_tags(answers[0])
+    quiz = compile_quiz(answers[0])
+    it = cycle(food_tags)
+    report("before: lower() + set intersection", timeit.timeit(lambda: legacy_match_score(next(it), user_tags), number=n), n)
+    it = cycle(food_masks)
+    user_mask, score_by_matches = quiz.mask, quiz.score_by_matches
+    report("after: mask AND + popcount", timeit.timeit(lambda: score_by_matches[(next(it) & user_mask).bit_count()], number=n), n)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from changefeed import get_tenant_version
+from context import eligibility_mask
+from database import SessionLocal
+from dietary import DietaryIndex
+from models import FoodItem, TenantVersion
+from tenants import DEFAULT_TENANT
+from vocabulary import vocabulary
+
+# Snapshots of least recently used tenants are dropped once the estimated
+# size of all loaded snapshots exceeds this (the one in use is always kept)
+CATALOG_MEMORY_BUDGET_MB = float(os.getenv("CATALOG_MEMORY_BUDGET_MB", "512"))
+
+# How often the refresher polls tenant versions (seconds)
+CATALOG_REFRESH_INTERVAL = float(os.getenv("CATALOG_REFRESH_INTERVAL", "1.0"))
+
+# Items measured to estimate a snapshot's size
+SIZE_SAMPLE = 64
+
+
+class CatalogItem:
+    """Read-only copy of a FoodItem with its tags lowercased and interned"""
+    __slots__ = ("id", "tags", "tag_ids", "tag_mask", "context_mask", "data")
+
+    def __init__(self, food: FoodItem):
+        self.id = food.id
+        self.tags: Tuple[str, ...] = tuple(dict.fromkeys(
+            vocabulary.canonical(tag) for tag in food.tags or []
+        ))
+        self.tag_ids = vocabulary.id_set(self.tags)
+        self.tag_mask = vocabulary.mask(self.tags)
+        self.context_mask = eligibility_mask(self.tag_mask)
+        self.data = food.to_dict()
+
+    def to_dict(self) -> dict:
+        return dict(self.data)
+
+
+def estimate_size(items: Tuple[CatalogItem, ...]) -> int:
+    """Rough memory footprint of a snapshot's items, from a sample"""
+    if not items:
+        return 0
+    sample = items[:SIZE_SAMPLE]
+    sampled = sum(
+        sys.getsizeof(item) + sys.getsizeof(item.tags) + sys.getsizeof(item.tag_ids)
+        + sys.getsizeof(item.data) + sum(sys.getsizeof(value) for value in item.data.values())
+        for item in sample
+    )
+    return sampled * len(items) // len(sample)
+
+
+class CatalogSnapshot:
+    """Immutable view of one tenant's catalog at a given tenant version"""
+
+    def __init__(self, version: int, items: List[CatalogItem], load_ms: float = 0.0, tenant: str = DEFAULT_TENANT):
+        self.tenant = tenant
+        self.version = version
+        self.items: Tuple[CatalogItem, ...] = tuple(items)
+        self.by_id = {item.id: item for item in self.items}
+        # Item-position bitsets for dietary filters and cuisine
+        self.dietary = DietaryIndex(self.items)
+        self.load_ms = load_ms
+        # Aggregates served straight from the snapshot
+        self.cuisines = list(self.dietary.cuisines)
+        self.size_bytes = estimate_size(self.items) + self.dietary.size_bytes()
+
+
+def load_snapshot(db: Session, tenant: str = DEFAULT_TENANT) -> CatalogSnapshot:
+    """Build a tenant's snapshot from the database"""
+    started = time.perf_counter()
+    # Read the version first: if a write lands in between, the snapshot is
+    # newer than its label and the next poll simply rebuilds it again
+    version = get_tenant_version(db.connection(), tenant) or 0
+    foods = db.query(FoodItem).filter(FoodItem.tenant == tenant).order_by(FoodItem.id).all()
+    items = [CatalogItem(food) for food in foods]
+    return CatalogSnapshot(version, items, round((time.perf_counter() - started) * 1000, 2), tenant)
+
+
+class CatalogRegistry:
+    """Per-tenant snapshots: loaded on first use, refreshed in the background, evicted LRU.
+
+    Requests only read the published snapshot; a refresh builds a new one off
+    the request path and swaps the reference, so in-flight requests finish on
+    the snapshot they started with. Only a tenant's first load happens inline,
+    under that tenant's own lock.
+    """
+
+    def __init__(self, budget_bytes: int):
+        self.budget_bytes = budget_bytes
+        self._snapshots: "OrderedDict[str, CatalogSnapshot]" = OrderedDict()
+        self._load_locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.refreshes = 0
+        self.last_refresh_ms = 0.0
+
+    def get(self, db: Session, tenant: str) -> CatalogSnapshot:
+        with self._lock:
+            snapshot = self._snapshots.get(tenant)
+            if snapshot is not None:
+                self._snapshots.move_to_end(tenant)
+                return snapshot
+
+        if get_tenant_version(db.connection(), tenant) is None:
+            # Unknown tenant: nothing to load, and nothing worth keeping (not even a lock)
+            return CatalogSnapshot(0, [], tenant=tenant)
+        with self._lock:
+            load_lock = self._load_locks.setdefault(tenant, threading.Lock())
+
+        with load_lock:
+            snapshot = self._snapshots.get(tenant)
+            if snapshot is not None:
+                return snapshot
+            snapshot = load_snapshot(db, tenant)
+            self._publish(snapshot)
+            return snapshot
+
+    def refresh_changed(self, db: Session) -> List[str]:
+        """Rebuild the loaded snapshots whose tenant version moved; returns the tenants refreshed"""
+        versions = dict(db.execute(select(TenantVersion.tenant, TenantVersion.version)).all())
+        with self._lock:
+            stale = [
+                tenant for tenant, snapshot in self._snapshots.items()
+                if versions.get(tenant, snapshot.version) != snapshot.version
+            ]
+        for tenant in stale:
+            with self._load_locks[tenant]:
+                snapshot = load_snapshot(db, tenant)
+                with self._lock:
+                    if tenant not in self._snapshots:
+                        continue  # evicted while rebuilding
+                self._publish(snapshot, keep_position=True)
+            self.refreshes += 1
+            self.last_refresh_ms = snapshot.load_ms
+        return stale
+
+    def loaded(self) -> List[CatalogSnapshot]:
+        with self._lock:
+            return list(self._snapshots.values())
+
+    def _publish(self, snapshot: CatalogSnapshot, keep_position: bool = False):
+        """Swap in a snapshot (a single reference assignment), then enforce the memory budget"""
+        with self._lock:
+            self._snapshots[snapshot.tenant] = snapshot
+            if not keep_position:
+                self._snapshots.move_to_end(snapshot.tenant)
+            total = sum(loaded.size_bytes for loaded in self._snapshots.values())
+            while total > self.budget_bytes and len(self._snapshots) > 1:
+                tenant = next(iter(self._snapshots))
+                if tenant == snapshot.tenant:
+                    break
+                total -= self._snapshots.pop(tenant).size_bytes
+                self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            snapshots = list(self._snapshots.values())
+        return {
+            "budget_mb": round(self.budget_bytes / 1024 / 1024, 1),
+            "loaded_mb": round(sum(snapshot.size_bytes for snapshot in snapshots) / 1024 / 1024, 1),
+            "evictions": self.evictions,
+            "refreshes": self.refreshes,
+            "last_refresh_ms": self.last_refresh_ms,
+            "tenants": [
+                {
+                    "tenant": snapshot.tenant,
+                    "version": snapshot.version,
+                    "items": len(snapshot.items),
+                    "size_mb": round(snapshot.size_bytes / 1024 / 1024, 2),
+                    "load_ms": snapshot.load_ms,
+                }
+                for snapshot in reversed(snapshots)  # most recently used first
+            ],
+        }
+
+
+catalogs = CatalogRegistry(int(CATALOG_MEMORY_BUDGET_MB * 1024 * 1024))
+
+
+def get_catalog(db: Session, tenant: str = DEFAULT_TENANT) -> CatalogSnapshot:
+    """Published snapshot of a tenant's catalog (kept current by CatalogRefresher)"""
+    return catalogs.get(db, tenant)
+
+
+class CatalogRefresher:
+    """Background task that polls tenant versions and refreshes changed snapshots"""
+
+    def __init__(self, registry: CatalogRegistry, interval: float = CATALOG_REFRESH_INTERVAL):
+        self.registry = registry
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Called with each loaded snapshot after every poll, on the refresher's thread;
+        # listeners must only hand work off (e.g. queue it) so refreshes are never held up
+        self.listeners: List[Callable[[CatalogSnapshot], None]] = []
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def wake(self):
+        """Refresh now rather than at the next poll, e.g. after a local write; thread-safe"""
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    def refresh(self) -> List[str]:
+        db = SessionLocal()
+        try:
+            refreshed = self.registry.refresh_changed(db)
+        finally:
+            db.close()
+        for snapshot in self.registry.loaded():
+            for listener in self.listeners:
+                listener(snapshot)
+        return refreshed
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            try:
+                await self._loop.run_in_executor(None, self.refresh)
+            except Exception as e:
+                print(f"Error refreshing catalog snapshots: {e}")
+
+
+catalog_refresher = CatalogRefresher(catalogs)
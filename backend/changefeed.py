@@ -0,0 +1,162 @@
+import os
+from typing import List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from models import CatalogChange, TenantVersion
+
+# How many changelog rows to keep when pruning at startup
+CHANGELOG_RETENTION = int(os.getenv("CATALOG_CHANGELOG_RETENTION", "100000"))
+
+# Bumps a tenant's version to the changelog version just written (read from the
+# table: sqlite_sequence is only updated once the triggering statement ends)
+BUMP_TENANT = """
+        INSERT INTO tenant_versions (tenant, version)
+        VALUES ({tenant}, (SELECT MAX(version) FROM catalog_changes))
+        ON CONFLICT (tenant) DO UPDATE SET version = excluded.version;"""
+
+# Triggers run inside the writing transaction, so every write path (ORM, raw
+# SQL, other processes) bumps the catalog version exactly once per row change,
+# along with the version of the tenant(s) the row belongs to
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS food_items_changefeed_insert
+    AFTER INSERT ON food_items
+    BEGIN
+        INSERT INTO catalog_changes (food_id, tenant, op) VALUES (NEW.id, NEW.tenant, 'insert');{BUMP_TENANT.format(tenant="NEW.tenant")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS food_items_changefeed_update
+    AFTER UPDATE ON food_items
+    BEGIN
+        INSERT INTO catalog_changes (food_id, tenant, op)
+        SELECT OLD.id, OLD.tenant, 'delete' WHERE OLD.id != NEW.id OR OLD.tenant != NEW.tenant;
+        INSERT INTO catalog_changes (food_id, tenant, op) VALUES (NEW.id, NEW.tenant, 'update');{BUMP_TENANT.format(tenant="OLD.tenant")}{BUMP_TENANT.format(tenant="NEW.tenant")}
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS food_items_changefeed_delete
+    AFTER DELETE ON food_items
+    BEGIN
+        INSERT INTO catalog_changes (food_id, tenant, op) VALUES (OLD.id, OLD.tenant, 'delete');{BUMP_TENANT.format(tenant="OLD.tenant")}
+    END
+    """,
+]
+
+
+def install_change_feed(engine: Engine):
+    """Create the changelog tables and (re)create the triggers"""
+    CatalogChange.__table__.create(bind=engine, checkfirst=True)
+    TenantVersion.__table__.create(bind=engine, checkfirst=True)
+    with engine.begin() as conn:
+        # Changelogs from before tenants existed: their rows stay visible to no tenant
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(catalog_changes)")]
+        if "tenant" not in columns:
+            conn.exec_driver_sql("ALTER TABLE catalog_changes ADD COLUMN tenant VARCHAR(50)")
+        conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_catalog_changes_tenant ON catalog_changes (tenant)"
+        )
+        # Recreate rather than keep triggers from an older schema
+        existing = conn.execute(text(
+            "SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'food_items_changefeed_%'"
+        )).scalars().all()
+        for name in existing:
+            conn.exec_driver_sql(f"DROP TRIGGER {name}")
+        for trigger in TRIGGERS:
+            conn.exec_driver_sql(trigger)
+        # Tenants with rows but no version yet (new databases, upgrades, bulk loads)
+        conn.execute(text(
+            "INSERT OR IGNORE INTO tenant_versions (tenant, version) "
+            "SELECT DISTINCT tenant, :version FROM food_items"
+        ), {"version": get_catalog_version(conn)})
+
+
+def get_catalog_version(conn: Connection) -> int:
+    """Current catalog version; a single-row lookup, cheap enough to poll per request"""
+    # sqlite_sequence keeps the high-water mark even after the log is pruned
+    version = conn.execute(
+        text("SELECT seq FROM sqlite_sequence WHERE name = 'catalog_changes'")
+    ).scalar()
+    return version or 0
+
+
+def get_tenant_version(conn: Connection, tenant: str) -> Optional[int]:
+    """Catalog version of one tenant (None if it never had items); unchanged while other tenants are written to"""
+    return conn.execute(
+        text("SELECT version FROM tenant_versions WHERE tenant = :tenant"), {"tenant": tenant}
+    ).scalar()
+
+
+def get_oldest_tenant_version(conn: Connection) -> int:
+    """Lowest live tenant version; anything cached for an older version is stale"""
+    return conn.execute(text("SELECT MIN(version) FROM tenant_versions")).scalar() or 0
+
+
+def get_changes_since(conn: Connection, since: int, limit: Optional[int] = None,
+                      tenant: Optional[str] = None) -> dict:
+    """Changes after `since` (to one tenant's items, if given), collapsed to the latest operation per food id.
+
+    If the log no longer reaches back to `since` the result has `reset` set and
+    the caller has to reload the full catalog instead of applying deltas.
+    """
+    version = get_catalog_version(conn)
+    oldest = conn.execute(text("SELECT MIN(version) FROM catalog_changes")).scalar()
+    if oldest is None:
+        oldest = version + 1
+    if since < oldest - 1:
+        return {"version": version, "reset": True, "changes": []}
+
+    query = "SELECT version, food_id, op FROM catalog_changes WHERE version > :since"
+    params = {"since": since}
+    if tenant is not None:
+        query += " AND tenant = :tenant"
+        params["tenant"] = tenant
+    query += " ORDER BY version"
+    if limit is not None:
+        query += " LIMIT :limit"
+        params["limit"] = limit
+    rows = conn.execute(text(query), params).all()
+
+    # Collapse to the final state per id; an insert followed by updates is still an upsert
+    latest = {}
+    for row_version, food_id, op in rows:
+        latest[food_id] = (row_version, "delete" if op == "delete" else "upsert")
+    changes: List[dict] = [
+        {"version": row_version, "food_id": food_id, "op": op}
+        for food_id, (row_version, op) in sorted(latest.items(), key=lambda item: item[1][0])
+    ]
+
+    # With a limit the caller resumes from the last row it was actually given
+    if rows and limit is not None and len(rows) == limit:
+        version = rows[-1][0]
+
+    return {"version": version, "reset": False, "changes": changes}
+
+
+def reset_change_feed(engine: Engine):
+    """Bump the version and empty the log, so every consumer reloads in full.
+
+    Used after bulk loads that bypass the triggers.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO catalog_changes (food_id, op) VALUES (0, 'reset')"))
+        conn.execute(text("DELETE FROM catalog_changes"))
+        conn.execute(
+            text(
+                "INSERT OR REPLACE INTO tenant_versions (tenant, version) "
+                "SELECT DISTINCT tenant, :version FROM food_items"
+            ),
+            {"version": get_catalog_version(conn)}
+        )
+
+
+def prune_changes(engine: Engine, keep: int = CHANGELOG_RETENTION):
+    """Drop all but the most recent `keep` changelog rows"""
+    with engine.begin() as conn:
+        version = get_catalog_version(conn)
+        conn.execute(
+            text("DELETE FROM catalog_changes WHERE version <= :cutoff"),
+            {"cutoff": version - keep}
+        )
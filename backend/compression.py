@@ -0,0 +1,112 @@
+import gzip
+import os
+
+from starlette.datastructures import Headers, MutableHeaders
+
+# Brotli is optional; without it only gzip is offered
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Responses smaller than this are sent as-is; compressing them costs more than it saves
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))
+GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+
+def parse_accept_encoding(accept_encoding: str) -> dict:
+    """Encoding -> q value from an Accept-Encoding header (q defaults to 1)"""
+    weights = {}
+    for value in accept_encoding.split(","):
+        coding, *params = [part.strip() for part in value.split(";")]
+        if not coding:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, number = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(number)
+                except ValueError:
+                    q = 0.0
+        weights[coding.lower()] = q
+    return weights
+
+
+def choose_encoding(accept_encoding: str):
+    """Preferred encoding the client accepts: br when available, else gzip.
+
+    q=0 marks an encoding as not acceptable; "*" covers encodings not listed.
+    """
+    weights = parse_accept_encoding(accept_encoding)
+    default = weights.get("*", 0.0)
+    if brotli is not None and weights.get("br", default) > 0:
+        return "br"
+    if weights.get("gzip", default) > 0:
+        return "gzip"
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class CompressionMiddleware:
+    """Compress complete responses above a size threshold with br or gzip.
+
+    API responses are sent in one body message; streaming responses (more
+    than one body message) are passed through untouched. Every response
+    carries Vary: Accept-Encoding, since whether it is compressed depends on it.
+    """
+
+    def __init__(self, app, minimum_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            async def send_identity(message):
+                if message["type"] == "http.response.start":
+                    MutableHeaders(scope=message).add_vary_header("Accept-Encoding")
+                await send(message)
+
+            await self.app(scope, receive, send_identity)
+            return
+
+        start_message = None
+        streaming = False
+
+        async def send_wrapper(message):
+            nonlocal start_message, streaming
+            if message["type"] == "http.response.start":
+                start_message = message
+                MutableHeaders(scope=start_message).add_vary_header("Accept-Encoding")
+                return
+            if message["type"] != "http.response.body" or streaming:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            headers = MutableHeaders(raw=start_message["headers"])
+            if message.get("more_body", False):
+                streaming = True
+                await send(start_message)
+                await send(message)
+                return
+
+            if len(body) >= self.minimum_size and "content-encoding" not in headers:
+                body = compress(body, encoding)
+                headers["Content-Encoding"] = encoding
+                headers["Content-Length"] = str(len(body))
+            await send(start_message)
+            await send({"type": "http.response.body", "body": body})
+
+        await self.app(scope, receive, send_wrapper)
@@ -0,0 +1,72 @@
+import os
+from datetime import datetime
+from typing import List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from vocabulary import vocabulary
+
+# Used when the client sends no (or an unknown) X-Timezone header
+DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "Asia/Kolkata")
+
+# Score points added per active context an item is eligible for
+CONTEXT_BOOST = float(os.getenv("CONTEXT_BOOST", "3"))
+
+# Request contexts and the catalog tags that make an item a good fit for each.
+# Each context is one bit; items get an eligibility mask at snapshot load.
+CONTEXT_TAGS = {
+    "breakfast": ["breakfast", "brunch", "toast", "chai", "coffee", "tea", "juice", "smoothie", "yogurt"],
+    "lunch": ["rice", "sandwich", "wrap", "salad", "noodles", "soup", "balanced"],
+    "evening_snack": ["tea_time", "snack", "chai", "tea", "coffee", "crispy", "appetizer"],
+    "dinner": ["filling", "heavy", "rice", "noodles", "comfort", "family", "shareable"],
+    "late_night": ["comfort", "greasy", "fastfood", "pizza", "burger", "dessert", "icecream", "delivery"],
+    "weekday": ["quick", "easy", "single_serving", "affordable", "cheap"],
+    "weekend": ["brunch", "treat", "special", "celebratory", "indulgent", "party"],
+}
+CONTEXTS = list(CONTEXT_TAGS)
+CONTEXT_BITS = {name: 1 << index for index, name in enumerate(CONTEXTS)}
+CONTEXT_TAG_MASKS = [(CONTEXT_BITS[name], vocabulary.mask(tags)) for name, tags in CONTEXT_TAGS.items()]
+
+
+def eligibility_mask(tag_mask: int) -> int:
+    """Context bits an item with these tags is eligible for (computed once per snapshot)"""
+    mask = 0
+    for bit, context_tag_mask in CONTEXT_TAG_MASKS:
+        if tag_mask & context_tag_mask:
+            mask |= bit
+    return mask
+
+
+def meal_time(hour: int) -> str:
+    if 5 <= hour < 11:
+        return "breakfast"
+    elif 11 <= hour < 15:
+        return "lunch"
+    elif 15 <= hour < 18:
+        return "evening_snack"
+    elif 18 <= hour < 22:
+        return "dinner"
+    return "late_night"
+
+
+def request_context(timezone: Optional[str] = None, now: Optional[datetime] = None) -> int:
+    """Context bits for a request: meal-time bucket and weekday/weekend in the client's timezone"""
+    try:
+        tz = ZoneInfo(timezone or DEFAULT_TIMEZONE)
+    except (ZoneInfoNotFoundError, ValueError):
+        tz = ZoneInfo(DEFAULT_TIMEZONE)
+    local = (now or datetime.now(tz)).astimezone(tz)
+    day = "weekend" if local.weekday() >= 5 else "weekday"
+    return CONTEXT_BITS[meal_time(local.hour)] | CONTEXT_BITS[day]
+
+
+def context_names(bits: int) -> List[str]:
+    return [name for name in CONTEXTS if bits & CONTEXT_BITS[name]]
+
+
+def context_tag_mask(bits: int) -> int:
+    """Union of the catalog tags behind the active contexts (for explanations)"""
+    mask = 0
+    for bit, context_tag_mask in CONTEXT_TAG_MASKS:
+        if bits & bit:
+            mask |= context_tag_mask
+    return mask
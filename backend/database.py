@@ -3,8 +3,8 @@ from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 
-# SQLite database file path
-DATABASE_URL = "sqlite:///./food.db"
+# SQLite database file path (override with DATABASE_URL, e.g. for scale tests)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./food.db")
 
 # Create engine
 engine = create_engine(
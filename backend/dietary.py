@@ -0,0 +1,136 @@
+import sys
+from itertools import compress, islice
+from typing import Dict, Iterator, List, Optional, Sequence, get_args
+
+from sqlalchemy.engine import Engine
+
+from schemas import Claim, DietaryFilters
+
+# Dietary claims live in FoodItem.claims, set explicitly by an operator (admin API),
+# and must be present on the item: one without "nut_free" may contain nuts.
+# They are not tags, so scoring, search and similarity never see them.
+CLAIMS = get_args(Claim)
+
+_BITS_TO_FLAGS = bytes.maketrans(b"01", b"\x00\x01")
+_FLAGS_TO_BITS = bytes.maketrans(b"\x00\x01", b"01")
+
+
+def to_mask(flags: bytes) -> int:
+    """Pack one 0/1 byte per item into an int bitset (bit i = item i)"""
+    if not flags:
+        return 0
+    return int(flags.translate(_FLAGS_TO_BITS)[::-1], 2)
+
+
+class BitSlicedIndex:
+    """Integer attribute as one item bitset per binary digit.
+
+    `at_most(value)` is a handful of big-int ANDs/ORs whatever the catalog
+    size, instead of a comparison per item.
+    """
+
+    def __init__(self, values: Sequence[int], all_items: int):
+        self.all_items = all_items
+        width = max(max(values, default=0).bit_length(), 1)
+        self.slices = [to_mask(bytes(value >> k & 1 for value in values)) for k in range(width)]
+
+    def at_most(self, value: int) -> int:
+        if value < 0:
+            return 0
+        if value >> len(self.slices):
+            return self.all_items
+        below, equal = 0, self.all_items
+        for k in reversed(range(len(self.slices))):
+            if value >> k & 1:
+                below |= equal & ~self.slices[k]
+                equal &= self.slices[k]
+            else:
+                equal &= ~self.slices[k]
+        return below | equal
+
+
+class DietaryIndex:
+    """Per-snapshot bitsets over item positions, one per dietary attribute"""
+
+    def __init__(self, items: Sequence):
+        self.all_items = (1 << len(items)) - 1
+
+        # One flag byte per item while scanning, packed into int bitsets at the end
+        vegetarian = bytearray(len(items))
+        claims = {name: bytearray(len(items)) for name in CLAIMS}
+        cuisines: Dict[str, bytearray] = {}
+        prices, spice_levels = [], []
+        for position, item in enumerate(items):
+            data = item.data
+            if data["is_vegetarian"]:
+                vegetarian[position] = 1
+            for name in data["claims"]:
+                if name in claims:
+                    claims[name][position] = 1
+            if data["cuisine"] not in cuisines:
+                cuisines[data["cuisine"]] = bytearray(len(items))
+            cuisines[data["cuisine"]][position] = 1
+            prices.append(max(data["avg_price"] or 0, 0))
+            spice_levels.append(max(data["spice_level"] or 0, 0))
+
+        self.vegetarian = to_mask(vegetarian)
+        # Vegan implies vegetarian, whatever the claims say
+        self.claims = {name: to_mask(flags) for name, flags in claims.items()}
+        self.claims["vegan"] &= self.vegetarian
+        self.cuisines = {cuisine: to_mask(flags) for cuisine, flags in cuisines.items()}
+        self.price = BitSlicedIndex(prices, self.all_items)
+        self.spice = BitSlicedIndex(spice_levels, self.all_items)
+
+    def size_bytes(self) -> int:
+        bitsets = [
+            self.vegetarian, *self.claims.values(), *self.cuisines.values(),
+            *self.price.slices, *self.spice.slices,
+        ]
+        return sum(sys.getsizeof(bitset) for bitset in bitsets)
+
+    def mask(self, filters: DietaryFilters, cuisine: Optional[str] = None) -> Optional[int]:
+        """Items passing every active filter, or None when nothing is filtered"""
+        mask = None
+        if filters.vegetarian:
+            mask = self.vegetarian
+        for name in CLAIMS:
+            if getattr(filters, name):
+                mask = self.claims[name] if mask is None else mask & self.claims[name]
+        if filters.max_price is not None:
+            price = self.price.at_most(filters.max_price)
+            mask = price if mask is None else mask & price
+        if filters.max_spice is not None:
+            spice = self.spice.at_most(filters.max_spice)
+            mask = spice if mask is None else mask & spice
+        if cuisine is not None:
+            in_cuisine = self.cuisines.get(cuisine, 0)
+            mask = in_cuisine if mask is None else mask & in_cuisine
+        return mask
+
+
+def select(items: Sequence, mask: Optional[int], limit: Optional[int] = None) -> List:
+    """Items whose position bit is set in `mask` (all items for None), in catalog order"""
+    if mask is None:
+        return list(items[:limit] if limit is not None else items)
+    # bin() lists bits most significant first; reverse and map '0'/'1' to 0/1 bytes
+    flags = bin(mask)[:1:-1].encode().translate(_BITS_TO_FLAGS)
+    selected: Iterator = compress(items, flags)
+    return list(islice(selected, limit) if limit is not None else selected)
+
+
+def filter_key(filters: DietaryFilters) -> str:
+    """Compact cache-key fragment for the active filters ("" when none are set)"""
+    parts = [name for name in ("vegetarian", *CLAIMS) if getattr(filters, name)]
+    if filters.max_price is not None:
+        parts.append(f"p{filters.max_price}")
+    if filters.max_spice is not None:
+        parts.append(f"s{filters.max_spice}")
+    return ",".join(parts)
+
+
+def install_claims_column(engine: Engine):
+    """Add food_items.claims to databases created before claims existed (no claims set)"""
+    with engine.begin() as conn:
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(food_items)")]
+        if "claims" not in columns:
+            conn.exec_driver_sql("ALTER TABLE food_items ADD COLUMN claims JSON")
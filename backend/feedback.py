@@ -0,0 +1,191 @@
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from sqlalchemy import func, select
+
+from database import engine
+from models import FeedbackEvent, FoodItem
+
+# Queue / batching knobs (overridable via environment)
+QUEUE_MAXSIZE = int(os.getenv("FEEDBACK_QUEUE_MAXSIZE", "10000"))
+BATCH_SIZE = int(os.getenv("FEEDBACK_BATCH_SIZE", "500"))
+FLUSH_INTERVAL = float(os.getenv("FEEDBACK_FLUSH_INTERVAL", "1.0"))  # seconds
+
+# Maximum score points popularity can add or remove from a match score
+ITEM_BOOST_MAX = 5.0
+TAG_BOOST_MAX = 2.0
+# Net votes at which a boost reaches half of its maximum
+BOOST_HALF_VOTES = 10
+
+
+class FeedbackPipeline:
+    """Bounded in-process queue of feedback events, flushed to SQLite in batches"""
+
+    def __init__(self, maxsize: int = QUEUE_MAXSIZE, batch_size: int = BATCH_SIZE,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[tuple] = []
+
+        # Running popularity counters (net votes)
+        self.item_votes: Dict[int, int] = defaultdict(int)
+        self.tag_votes: Dict[str, int] = defaultdict(int)
+
+        # Accounting
+        self.accepted = 0
+        self.dropped = 0  # rejected when the queue was full, or lost in a failed flush
+        self.written = 0
+        self.skipped = 0  # events for unknown food ids
+        self.batches = 0
+        self.last_flush_ms = 0.0
+
+    def submit(self, food_id: int, vote: int) -> bool:
+        """Enqueue a feedback event without blocking. Returns False if the queue is full."""
+        if self.queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait((food_id, vote, datetime.utcnow()))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        self.accepted += 1
+        return True
+
+    async def start(self):
+        """Load persisted counters and start the background flush task"""
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.load_counters)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flush task and write out whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.queue is not None:
+            # Include the batch the task was still gathering when cancelled
+            batch, self._batch = self._batch, []
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch:
+                try:
+                    self.flush(batch)
+                except Exception as e:
+                    self.dropped += len(batch)
+                    print(f"Error flushing feedback batch: {e}")
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block for the first event, then gather more until the batch is
+            # full or the flush interval has passed
+            self._batch = batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._batch = []
+            try:
+                await loop.run_in_executor(None, self.flush, batch)
+            except Exception as e:
+                self.dropped += len(batch)
+                print(f"Error flushing feedback batch: {e}")
+
+    def flush(self, batch: List[tuple]):
+        """Write a batch of events in a single transaction and update counters"""
+        started = datetime.utcnow()
+        food_ids = {food_id for food_id, _, _ in batch}
+
+        with engine.begin() as conn:
+            food_tags = _fetch_tags(conn, food_ids)
+
+            events = [
+                {"food_id": food_id, "vote": vote, "created_at": created_at}
+                for food_id, vote, created_at in batch
+                if food_id in food_tags
+            ]
+            if events:
+                conn.execute(FeedbackEvent.__table__.insert(), events)
+
+        for event in events:
+            self.item_votes[event["food_id"]] += event["vote"]
+            for tag in food_tags[event["food_id"]]:
+                self.tag_votes[tag] += event["vote"]
+
+        self.written += len(events)
+        self.skipped += len(batch) - len(events)
+        self.batches += 1
+        self.last_flush_ms = round((datetime.utcnow() - started).total_seconds() * 1000, 2)
+
+    def load_counters(self):
+        """Rebuild popularity counters from persisted feedback"""
+        with engine.connect() as conn:
+            votes = conn.execute(
+                select(FeedbackEvent.food_id, func.sum(FeedbackEvent.vote))
+                .group_by(FeedbackEvent.food_id)
+            ).all()
+            if not votes:
+                return
+            food_tags = _fetch_tags(conn, [food_id for food_id, _ in votes])
+
+        self.item_votes.clear()
+        self.tag_votes.clear()
+        for food_id, net in votes:
+            self.item_votes[food_id] = net
+            for tag in food_tags.get(food_id, []):
+                self.tag_votes[tag] += net
+
+    def popularity_boost(self, food_id: int, tags: List[str]) -> float:
+        """Score adjustment for a food item based on accumulated feedback"""
+        if not self.item_votes:
+            return 0.0
+        boost = ITEM_BOOST_MAX * _squash(self.item_votes.get(food_id, 0))
+        if tags and self.tag_votes:
+            tag_net = sum(self.tag_votes.get(tag, 0) for tag in tags) / len(tags)
+            boost += TAG_BOOST_MAX * _squash(tag_net)
+        return boost
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "capacity": self.maxsize,
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "written": self.written,
+            "skipped": self.skipped,
+            "batches": self.batches,
+            "last_flush_ms": self.last_flush_ms,
+        }
+
+
+def _squash(net: float) -> float:
+    """Map net votes onto (-1, 1) so a handful of votes cannot dominate the score"""
+    return net / (abs(net) + BOOST_HALF_VOTES)
+
+
+def _fetch_tags(conn, food_ids) -> Dict[int, List[str]]:
+    rows = conn.execute(
+        select(FoodItem.id, FoodItem.tags).where(FoodItem.id.in_(list(food_ids)))
+    ).all()
+    return {food_id: [tag.lower() for tag in tags or []] for food_id, tags in rows}
+
+
+# Shared pipeline instance used by the API and the recommender
+feedback_pipeline = FeedbackPipeline()
@@ -0,0 +1,45 @@
+from typing import List, Optional
+
+from fastapi import HTTPException
+
+from models import FoodItem
+from schemas import FoodItemResponse
+
+# Fields a client can ask for with ?fields=
+FOOD_FIELDS = list(FoodItemResponse.model_fields)
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Parse a comma separated sparse fieldset; None means all fields"""
+    if not fields:
+        return None
+    requested = list(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in FOOD_FIELDS]
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(unknown)}. Available: {', '.join(FOOD_FIELDS)}"
+        )
+    return requested
+
+
+def food_columns(fields: List[str]):
+    """FoodItem columns to select for a sparse fieldset"""
+    return [getattr(FoodItem, field) for field in fields]
+
+
+def food_row_to_dict(fields: List[str], row) -> dict:
+    """Serialize a row selected with food_columns()"""
+    food = dict(zip(fields, row))
+    if "is_vegetarian" in food:
+        food["is_vegetarian"] = bool(food["is_vegetarian"])
+    if "claims" in food:
+        food["claims"] = food["claims"] or []
+    return food
+
+
+def project(food: dict, fields: Optional[List[str]]) -> dict:
+    """Restrict an already serialized food item to the requested fields"""
+    if fields is None:
+        return food
+    return {field: food[field] for field in fields}
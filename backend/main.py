@@ -1,21 +1,76 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import json
+
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 
 from database import engine, get_db, Base
 from models import FoodItem
 from schemas import (
     QuizAnswers, 
+    DietaryFilters, 
     FoodItemResponse, 
     RecommendationResponse, 
-    RecommendationWithScore,
-    HealthResponse
+    HealthResponse,
+    FeedbackRequest,
+    FeedbackResponse,
+    FeedbackStatsResponse,
+    CatalogVersionResponse,
+    CatalogChangesResponse,
+    FoodItemCreate,
+    FoodItemUpdate,
+    BulkDeleteRequest,
+    BulkWriteResponse,
+    DeleteResponse,
+    LimiterStatsResponse,
+    TraceStatsResponse,
+    SearchResponse,
+    SimilarFoodsResponse,
+    TenantCatalogsResponse
+)
+from recommendation import get_recommendations, get_random_fallback, explain_match, quiz_bucket_index, score_foods
+from catalog import CatalogSnapshot, catalog_refresher, catalogs, get_catalog
+from context import request_context
+from dietary import filter_key, install_claims_column, select
+from search import SEARCH_RERANK_POOL, install_search_index, search_foods
+from seed_data import seed_database
+from similarity import SIMILAR_TOP_K, neighbor_table
+from tenants import get_tenant, install_tenant_column
+from vocabulary import vocabulary
+from feedback import feedback_pipeline
+from changefeed import install_change_feed, get_catalog_version, get_changes_since, get_oldest_tenant_version, prune_changes
+from admin import ADMIN_TOKEN, require_admin, food_row, bulk_upsert, bulk_delete
+from compression import CompressionMiddleware
+from fieldsets import parse_fields, food_columns, food_row_to_dict, project
+from ratelimit import LoadControlMiddleware, load_shedder, limiter_stats
+from reccache import REC_CACHE_TTL, recommendation_cache, evict_periodically
+from profiling import (
+    PROFILING_ENABLED,
+    PROFILE_MAX_SECONDS,
+    ProfilerBusy,
+    RequestProfileMiddleware,
+    install_request_profiling,
+    profile_store,
+    sampler
 )
-from recommendation import get_recommendations, get_random_fallback
+from tracing import TRACING_ENABLED, TracingMiddleware, span, span_exporter, traced_get_db
+
+VOTES = {"up": 1, "down": -1}
 
 # Create database tables
 Base.metadata.create_all(bind=engine)
+install_tenant_column(engine)
+install_claims_column(engine)
+install_change_feed(engine)
+install_search_index(engine)
+# Keep similar-item rows current as the refresher publishes snapshots
+catalog_refresher.listeners.append(neighbor_table.notify)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -38,6 +93,12 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (br when available, else gzip)
+app.add_middleware(CompressionMiddleware)
+
+# Per-client rate limiting and global load shedding; added last so it runs first
+app.add_middleware(LoadControlMiddleware)
+
 
 @app.get("/", response_model=HealthResponse)
 def root():
@@ -69,67 +130,410 @@ def health_check(db: Session = Depends(get_db)):
 def get_all_foods(
     cuisine: str = None,
     limit: int = 50,
+    fields: Optional[str] = None,
+    filters: DietaryFilters = Depends(),
+    tenant: str = Depends(get_tenant),
     db: Session = Depends(get_db)
 ):
-    query = db.query(FoodItem)
+    selected = parse_fields(fields)
+    if filter_key(filters):
+        # Dietary constraints: intersect the snapshot's bitsets instead of querying
+        catalog = get_catalog(db, tenant)
+        mask = catalog.dietary.mask(filters, cuisine.lower() if cuisine else None)
+        foods = [project(food.to_dict(), selected) for food in select(catalog.items, mask, limit)]
+        return JSONResponse(foods) if selected else foods
+    if selected:
+        # Sparse fieldset: select only these columns and skip full-model validation
+        query = db.query(*food_columns(selected))
+    else:
+        query = db.query(FoodItem)
+    query = query.filter(FoodItem.tenant == tenant)
     if cuisine:
         query = query.filter(FoodItem.cuisine == cuisine.lower())
     foods = query.limit(limit).all()
+    if selected:
+        return JSONResponse([food_row_to_dict(selected, row) for row in foods])
     return foods
 
 
+def optional_quiz_answers(
+    hunger: Optional[int] = None,
+    budget: Optional[str] = None,
+    healthiness: Optional[int] = None,
+    temperature: Optional[int] = None,
+    spice: Optional[int] = None,
+    social: Optional[str] = None,
+    vibe: Optional[str] = None
+) -> Optional[QuizAnswers]:
+    """Quiz answers passed as query parameters: all of them or none"""
+    values = {
+        "hunger": hunger, "budget": budget, "healthiness": healthiness,
+        "temperature": temperature, "spice": spice, "social": social, "vibe": vibe
+    }
+    given = {key: value for key, value in values.items() if value is not None}
+    if not given:
+        return None
+    missing = [key for key in values if key not in given]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Ranking by quiz answers needs all of them; missing: {', '.join(missing)}"
+        )
+    return QuizAnswers(**given)
+
+
+@app.get("/api/foods/search", response_model=SearchResponse)
+def search(
+    q: str,
+    limit: int = Query(10, ge=1, le=100),
+    answers: Optional[QuizAnswers] = Depends(optional_quiz_answers),
+    x_timezone: Optional[str] = Header(None),
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """Prefix/full-text search over name, description, cuisine and tags"""
+    # Quiz re-ranking draws from a deeper pool, so a strong fit just below the text cut still shows
+    pool = limit * SEARCH_RERANK_POOL if answers is not None else limit
+    hits, took_ms = search_foods(db.connection(), q, pool, tenant)
+    
+    # Serve item bodies from the in-memory snapshot rather than a second query
+    catalog = get_catalog(db, tenant)
+    ranks = {food_id: rank for food_id, rank in hits}
+    foods = [catalog.by_id[food_id] for food_id, _ in hits if food_id in catalog.by_id]
+    
+    if answers is None:
+        results = [{"food": food.to_dict(), "rank": ranks[food.id]} for food in foods]
+    else:
+        # Re-rank text matches by how well they fit the quiz answers
+        scores = {food.id: score for food, score, _ in score_foods(foods, answers, request_context(x_timezone))}
+        foods.sort(key=lambda food: scores.get(food.id, 0.0), reverse=True)
+        results = [
+            {"food": food.to_dict(), "rank": ranks[food.id], "score": scores.get(food.id, 0.0)}
+            for food in foods[:limit]
+        ]
+    
+    return {"query": q, "results": results, "took_ms": took_ms}
+
+
 @app.get("/api/foods/{food_id}", response_model=FoodItemResponse)
-def get_food_by_id(food_id: int, db: Session = Depends(get_db)):
-    food = db.query(FoodItem).filter(FoodItem.id == food_id).first()
+def get_food_by_id(
+    food_id: int,
+    fields: Optional[str] = None,
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    selected = parse_fields(fields)
+    if selected:
+        row = db.query(*food_columns(selected)).filter(FoodItem.id == food_id, FoodItem.tenant == tenant).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="Food item not found")
+        return JSONResponse(food_row_to_dict(selected, row))
+    food = db.query(FoodItem).filter(FoodItem.id == food_id, FoodItem.tenant == tenant).first()
     if not food:
         raise HTTPException(status_code=404, detail="Food item not found")
     return food
 
 
+@app.get("/api/foods/{food_id}/similar", response_model=SimilarFoodsResponse)
+def get_similar_foods(
+    food_id: int,
+    limit: int = 5,
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    """Items sharing the most tags with this one, from the precomputed neighbor table"""
+    catalog = get_catalog(db, tenant)
+    if food_id not in catalog.by_id:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    neighbors = neighbor_table.get(db.connection(), tenant, food_id)
+    if neighbors is None:
+        # Not built for this snapshot yet: no suggestions for now, build in the background
+        catalog_refresher.wake()
+        neighbors = []
+    # Rows can briefly lag deletes; skip ids the snapshot no longer has
+    results = [
+        {"food": catalog.by_id[neighbor_id].to_dict(), "similarity": similarity}
+        for neighbor_id, similarity in neighbors
+        if neighbor_id in catalog.by_id
+    ]
+    return {"food_id": food_id, "results": results[:min(max(limit, 0), SIMILAR_TOP_K)]}
+
+
+def match_fields(food, answers: QuizAnswers, matched: int, context: int, explain: bool) -> dict:
+    """Match details for a recommendation; tag names are only built on request"""
+    fields = {"matched_count": matched.bit_count()}
+    if explain:
+        fields["matched_tags"] = vocabulary.names(matched)
+        fields["explanation"] = explain_match(food, answers, matched, context)
+    return fields
+
+
 @app.post("/api/recommend", response_model=RecommendationResponse)
-def get_recommendation(answers: QuizAnswers, db: Session = Depends(get_db)):
-    recommendations = get_recommendations(db, answers, limit=3)
+def get_recommendation(
+    answers: QuizAnswers,
+    explain: bool = False,
+    fields: Optional[str] = None,
+    x_timezone: Optional[str] = Header(None),
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    selected = parse_fields(fields)
+    # Meal time and weekday/weekend in the client's timezone
+    context = request_context(x_timezone)
+    # One snapshot for the whole request, even if a refresh swaps in a newer one meanwhile
+    with span("catalog_fetch") as fetch:
+        catalog = get_catalog(db, tenant)
+        fetch.set("items", len(catalog.items))
+    version = catalog.version
+    # Explanations echo the caller's exact answers, so those are keyed on the
+    # answers themselves rather than on their bucket
+    quiz_key = answers.model_dump_json() if explain else quiz_bucket_index(answers)
+    cache_key = (
+        f"{tenant}:{version}:{quiz_key}:{context}:{int(explain)}:"
+        f"{','.join(selected) if selected else '*'}:{filter_key(answers)}"
+    )
+    
+    # Under overload serve a cached response of any age rather than recomputing
+    degraded = load_shedder.degraded
+    with span("cache_lookup") as lookup:
+        body, tier = recommendation_cache.get(cache_key, max_age=None if degraded else REC_CACHE_TTL)
+        lookup.set("tier", tier)
+    headers = {"X-Cache": tier}
+    if body is not None and degraded:
+        load_shedder.served_degraded += 1
+        headers["X-Degraded"] = "1"
+    if body is None:
+        result = build_recommendation(db, answers, context, explain, selected, catalog)
+        with span("serialization"):
+            if selected:
+                # Sparse food objects do not fit RecommendationResponse; send as-is
+                body = JSONResponse(result).body
+            else:
+                body = RecommendationResponse.model_validate(result).model_dump_json().encode()
+        # A random fallback pick must not stick for the whole TTL
+        if result["total_matches"]:
+            recommendation_cache.put(cache_key, version, body)
+    
+    # Already serialized, so bypass response_model validation
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+def build_recommendation(
+    db: Session,
+    answers: QuizAnswers,
+    context: int,
+    explain: bool,
+    selected: Optional[List[str]],
+    catalog: CatalogSnapshot
+) -> dict:
+    recommendations = get_recommendations(db, answers, limit=3, context=context, catalog=catalog)
     
     if not recommendations:
-        fallback = get_random_fallback(db)
+        fallback = get_random_fallback(db, answers, catalog=catalog)
         if fallback:
             return {
-                "best_match": FoodItemResponse.model_validate(fallback.to_dict()),
+                "best_match": project(fallback.to_dict(), selected),
                 "score": 0.0,
-                "matched_tags": [],
+                **match_fields(fallback, answers, 0, context, explain),
                 "alternatives": [],
                 "total_matches": 0
             }
+        elif filter_key(answers):
+            raise HTTPException(
+                status_code=404,
+                detail="No food items match these dietary filters."
+            )
         else:
             raise HTTPException(
                 status_code=404, 
                 detail="No food items found. Please seed the database."
             )
     
-    best_food, best_score, best_tags = recommendations[0]
+    best_food, best_score, best_matched = recommendations[0]
     
     alternatives = [
-        RecommendationWithScore(
-            food=FoodItemResponse.model_validate(food.to_dict()),
-            score=score,
-            matched_tags=tags
-        )
-        for food, score, tags in recommendations[1:]
+        {
+            "food": project(food.to_dict(), selected),
+            "score": score,
+            **match_fields(food, answers, matched, context, explain)
+        }
+        for food, score, matched in recommendations[1:]
     ]
     
     return {
-        "best_match": FoodItemResponse.model_validate(best_food.to_dict()),
+        "best_match": project(best_food.to_dict(), selected),
         "score": best_score,
-        "matched_tags": best_tags,
+        **match_fields(best_food, answers, best_matched, context, explain),
         "alternatives": alternatives,
         "total_matches": len(recommendations)
     }
 
 
 @app.get("/api/cuisines")
-def get_cuisines(db: Session = Depends(get_db)):
-    cuisines = db.query(FoodItem.cuisine).distinct().all()
-    return {"cuisines": [c[0] for c in cuisines]}
+def get_cuisines(tenant: str = Depends(get_tenant), db: Session = Depends(get_db)):
+    return {"cuisines": get_catalog(db, tenant).cuisines}
+
+
+@app.get("/api/catalog/version", response_model=CatalogVersionResponse)
+def get_catalog_version_endpoint(db: Session = Depends(get_db)):
+    return {"version": get_catalog_version(db.connection())}
+
+
+@app.get("/api/catalog/changes", response_model=CatalogChangesResponse)
+def get_catalog_changes(
+    since: int = 0,
+    limit: int = 1000,
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    return get_changes_since(db.connection(), since, limit, tenant)
+
+
+@app.post("/api/admin/foods", response_model=FoodItemResponse, status_code=201,
+          dependencies=[Depends(require_admin)])
+def create_food(
+    item: FoodItemCreate,
+    response: Response,
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    food = FoodItem(**food_row(item), tenant=tenant)
+    if item.id is not None:
+        food.id = item.id
+    db.add(food)
+    try:
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        raise HTTPException(status_code=409, detail="Food item already exists")
+    response.headers["X-Catalog-Version"] = str(get_catalog_version(db.connection()))
+    catalog_refresher.wake()
+    return food.to_dict()
+
+
+@app.put("/api/admin/foods/{food_id}", response_model=FoodItemResponse,
+         dependencies=[Depends(require_admin)])
+def update_food(
+    food_id: int,
+    changes: FoodItemUpdate,
+    response: Response,
+    tenant: str = Depends(get_tenant),
+    db: Session = Depends(get_db)
+):
+    food = db.query(FoodItem).filter(FoodItem.id == food_id, FoodItem.tenant == tenant).first()
+    if not food:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    for field, value in changes.model_dump(exclude_unset=True).items():
+        if field == "cuisine":
+            value = value.lower()
+        elif field == "is_vegetarian":
+            value = int(value)
+        setattr(food, field, value)
+    db.commit()
+    response.headers["X-Catalog-Version"] = str(get_catalog_version(db.connection()))
+    catalog_refresher.wake()
+    return food.to_dict()
+
+
+@app.delete("/api/admin/foods/{food_id}", response_model=DeleteResponse,
+            dependencies=[Depends(require_admin)])
+def delete_food(food_id: int, tenant: str = Depends(get_tenant), db: Session = Depends(get_db)):
+    deleted = db.query(FoodItem).filter(FoodItem.id == food_id, FoodItem.tenant == tenant).delete()
+    if not deleted:
+        raise HTTPException(status_code=404, detail="Food item not found")
+    db.commit()
+    catalog_refresher.wake()
+    return {"deleted": deleted, "catalog_version": get_catalog_version(db.connection())}
+
+
+@app.post("/api/admin/foods/bulk", response_model=BulkWriteResponse,
+          dependencies=[Depends(require_admin)])
+async def bulk_upsert_foods(request: Request, tenant: str = Depends(get_tenant)):
+    """Upsert food items from a JSON array or an NDJSON stream (one item per line)"""
+    items = []
+    
+    def parse(index, raw):
+        try:
+            data = json.loads(raw) if isinstance(raw, bytes) else raw
+            items.append(FoodItemCreate.model_validate(data))
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Item {index}: invalid JSON ({e})")
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=f"Item {index}: {e.errors()}")
+    
+    if "ndjson" in request.headers.get("content-type", ""):
+        # Parse line by line as the body streams in
+        buffer = b""
+        index = 0
+        async for chunk in request.stream():
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    parse(index, line)
+                    index += 1
+        if buffer.strip():
+            parse(index, buffer)
+    else:
+        try:
+            payload = json.loads(await request.body())
+        except json.JSONDecodeError as e:
+            raise HTTPException(status_code=400, detail=f"Invalid JSON body ({e})")
+        if not isinstance(payload, list):
+            raise HTTPException(status_code=422, detail="Expected a JSON array of food items")
+        for index, data in enumerate(payload):
+            parse(index, data)
+    
+    result = await run_in_threadpool(bulk_upsert, engine, items, tenant)
+    catalog_refresher.wake()
+    return result
+
+
+@app.post("/api/admin/foods/bulk-delete", response_model=BulkWriteResponse,
+          dependencies=[Depends(require_admin)])
+def bulk_delete_foods(request: BulkDeleteRequest, tenant: str = Depends(get_tenant)):
+    result = bulk_delete(engine, request.ids, tenant)
+    catalog_refresher.wake()
+    return result
+
+
+@app.post("/api/feedback", response_model=FeedbackResponse, status_code=202)
+async def submit_feedback(feedback: FeedbackRequest):
+    vote = VOTES.get(feedback.vote.lower())
+    if vote is None:
+        raise HTTPException(status_code=400, detail="vote must be 'up' or 'down'")
+    
+    # Enqueue only; the background task persists events in batches
+    if not feedback_pipeline.submit(feedback.food_id, vote):
+        raise HTTPException(
+            status_code=503,
+            detail="Feedback queue is full. Please retry shortly.",
+            headers={"Retry-After": "1"}
+        )
+    
+    return {"status": "queued", "queued": feedback_pipeline.queue.qsize()}
+
+
+@app.get("/api/feedback/stats", response_model=FeedbackStatsResponse)
+def get_feedback_stats():
+    return feedback_pipeline.stats()
+
+
+@app.get("/api/catalog/tenants", response_model=TenantCatalogsResponse)
+def get_tenant_catalogs():
+    """Tenant snapshots loaded in this worker, most recently used first"""
+    return catalogs.stats()
+
+
+@app.get("/api/limiter/stats", response_model=LimiterStatsResponse)
+def get_limiter_stats():
+    return {**limiter_stats(), "cache": recommendation_cache.stats()}
+
+
+def oldest_catalog_version() -> int:
+    """Cached responses below every tenant's current version can be evicted"""
+    with engine.connect() as conn:
+        return get_oldest_tenant_version(conn)
 
 
 @app.on_event("startup")
@@ -139,11 +543,62 @@ async def startup_event():
     count = db.query(FoodItem).count()
     if count == 0:
         print("Database is empty. Running seed...")
-        from seed_data import seed_database
         seed_database()
     else:
         print(f"Database has {count} food items.")
     db.close()
+    prune_changes(engine)
+    app.state.cache_evictor = asyncio.create_task(evict_periodically(oldest_catalog_version))
+    await feedback_pipeline.start()
+    await catalog_refresher.start()
+    await neighbor_table.start()
+    if TRACING_ENABLED:
+        await span_exporter.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    app.state.cache_evictor.cancel()
+    await neighbor_table.stop()
+    await catalog_refresher.stop()
+    await feedback_pipeline.stop()
+    if TRACING_ENABLED:
+        await span_exporter.stop()
+
+
+# Debug profiling is opt-in; when disabled neither the routes nor the hooks exist
+if PROFILING_ENABLED:
+    @app.get("/api/debug/profile", response_class=PlainTextResponse,
+             dependencies=[Depends(require_admin)])
+    async def sample_profile(seconds: float = 10, interval_ms: float = 5):
+        """Sample live stacks for N seconds; output is collapsed-stack (flamegraph) format"""
+        seconds = min(max(seconds, 0.1), PROFILE_MAX_SECONDS)
+        interval = max(interval_ms, 1) / 1000
+        try:
+            return await run_in_threadpool(sampler.run, seconds, interval)
+        except ProfilerBusy as e:
+            raise HTTPException(status_code=409, detail=str(e))
+    
+    @app.get("/api/debug/profiles/{profile_id}", response_class=PlainTextResponse,
+             dependencies=[Depends(require_admin)])
+    def get_request_profile(profile_id: str):
+        report = profile_store.get(profile_id)
+        if report is None:
+            raise HTTPException(status_code=404, detail="Profile not found")
+        return report
+    
+    app.add_middleware(RequestProfileMiddleware, token=ADMIN_TOKEN)
+    install_request_profiling(app)
+
+
+# Tracing is opt-in too; added last so the root span covers every other middleware
+if TRACING_ENABLED:
+    @app.get("/api/tracing/stats", response_model=TraceStatsResponse)
+    def get_tracing_stats():
+        return span_exporter.stats()
+    
+    app.add_middleware(TracingMiddleware)
+    app.dependency_overrides[get_db] = traced_get_db
 
 
 if __name__ == "__main__":
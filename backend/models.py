@@ -1,10 +1,12 @@
-from sqlalchemy import Column, Integer, String, Text, JSON
+from sqlalchemy import Column, Integer, String, Text, JSON, DateTime, LargeBinary, func
 from database import Base
+from tenants import DEFAULT_TENANT
 
 class FoodItem(Base):
     __tablename__ = "food_items"
     
     id = Column(Integer, primary_key=True, index=True)
+    tenant = Column(String(50), nullable=False, default=DEFAULT_TENANT, server_default=DEFAULT_TENANT, index=True)  # city / restaurant catalog
     name = Column(String(100), nullable=False)
     emoji = Column(String(10), nullable=False)
     cuisine = Column(String(50), nullable=False)  # indian, chinese, fastfood, healthy, dessert, beverage
@@ -15,6 +17,7 @@ class FoodItem(Base):
     is_vegetarian = Column(Integer, default=0)  # 0 or 1
     serving_size = Column(String(20), default="regular")  # small, regular, large
     temperature = Column(String(10), default="hot")  # hot, cold, room
+    claims = Column(JSON, nullable=True)  # dietary claims an operator vouches for: vegan, nut_free, gluten_free
     
     def to_dict(self):
         return {
@@ -28,6 +31,54 @@ class FoodItem(Base):
             "spice_level": self.spice_level,
             "is_vegetarian": bool(self.is_vegetarian),
             "serving_size": self.serving_size,
-            "temperature": self.temperature
+            "temperature": self.temperature,
+            "claims": self.claims or []
         }
 
+
+
+class FeedbackEvent(Base):
+    __tablename__ = "feedback_events"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    food_id = Column(Integer, nullable=False, index=True)
+    vote = Column(Integer, nullable=False)  # 1 = thumbs up, -1 = thumbs down
+    created_at = Column(DateTime, nullable=False)
+
+
+class CatalogChange(Base):
+    """Changelog of food_items writes, filled by SQLite triggers (see changefeed.py)"""
+    __tablename__ = "catalog_changes"
+    __table_args__ = {"sqlite_autoincrement": True}  # versions are never reused
+    
+    version = Column(Integer, primary_key=True)
+    food_id = Column(Integer, nullable=False)
+    tenant = Column(String(50), nullable=True, index=True)  # tenant of the row (none for resets)
+    op = Column(String(10), nullable=False)  # insert, update, delete
+    changed_at = Column(DateTime, nullable=False, server_default=func.current_timestamp())
+
+
+class TenantVersion(Base):
+    """Catalog version per tenant: the changelog version of its latest write (see changefeed.py)"""
+    __tablename__ = "tenant_versions"
+    
+    tenant = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False)
+
+
+class FoodNeighbors(Base):
+    """Most similar items of a food item, precomputed (see similarity.py)"""
+    __tablename__ = "food_neighbors"
+    
+    food_id = Column(Integer, primary_key=True)
+    tenant = Column(String(50), nullable=False, index=True)
+    neighbors = Column(LargeBinary, nullable=False)  # uint32 ids, then uint16 similarities
+
+
+class NeighborVersion(Base):
+    """Tenant version the food_neighbors rows of a tenant were computed at"""
+    __tablename__ = "neighbor_versions"
+    
+    tenant = Column(String(50), primary_key=True)
+    version = Column(Integer, nullable=False)
+
@@ -0,0 +1,174 @@
+import asyncio
+import contextvars
+import cProfile
+import functools
+import hmac
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from typing import Optional
+
+from fastapi.routing import APIRoute
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+# Opt-in: nothing in this module is wired into the app unless this is set
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "0") == "1"
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))  # per-request profiles kept for download
+
+# Profile attached to the current request by RequestProfileMiddleware
+_request_profile: contextvars.ContextVar[Optional[cProfile.Profile]] = contextvars.ContextVar(
+    "request_profile", default=None
+)
+
+
+class ProfilerBusy(RuntimeError):
+    """A profiling session is already running"""
+
+
+class StackSampler:
+    """Samples every thread's Python stack at a fixed interval (one session at a time)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+
+    def run(self, seconds: float, interval: float) -> str:
+        """Sample for `seconds` and return collapsed stacks ("a;b;c count" per line)"""
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy("A sampling session is already running")
+        try:
+            own_thread = threading.get_ident()
+            stacks = Counter()
+            deadline = time.monotonic() + seconds
+            while time.monotonic() < deadline:
+                for thread_id, frame in sys._current_frames().items():
+                    if thread_id != own_thread:
+                        stacks[_collapse(frame)] += 1
+                time.sleep(interval)
+            return "".join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+        finally:
+            self._lock.release()
+
+
+def _collapse(frame) -> str:
+    frames = []
+    while frame is not None:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+sampler = StackSampler()
+
+
+class ProfileStore:
+    """The most recent per-request profiles, rendered as pstats text"""
+
+    def __init__(self, keep: int = PROFILE_KEEP):
+        self.keep = keep
+        self._profiles: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, profile: cProfile.Profile) -> str:
+        out = io.StringIO()
+        pstats.Stats(profile, stream=out).sort_stats("cumulative").print_stats(50)
+        profile_id = uuid.uuid4().hex[:12]
+        with self._lock:
+            self._profiles[profile_id] = out.getvalue()
+            while len(self._profiles) > self.keep:
+                self._profiles.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[str]:
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+
+profile_store = ProfileStore()
+
+
+class RequestProfileMiddleware:
+    """cProfile the endpoint of requests carrying `X-Profile: <ADMIN_TOKEN>`.
+
+    The profile id is returned in the X-Profile-Id response header; fetch the
+    report from /api/debug/profiles/{id}. One request is profiled at a time,
+    others asking for a profile meanwhile get a 409: cProfile allows a single
+    active profiler per process, and an async endpoint's profile also records
+    whatever else the event loop runs while it awaits.
+    """
+
+    def __init__(self, app, token: Optional[str]):
+        self.app = app
+        self.token = token
+        self._lock = threading.Lock()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.token:
+            await self.app(scope, receive, send)
+            return
+        header = Headers(scope=scope).get("x-profile")
+        if header is None or not hmac.compare_digest(header.encode(), self.token.encode()):
+            await self.app(scope, receive, send)
+            return
+        if not self._lock.acquire(blocking=False):
+            response = JSONResponse({"detail": "Another request is being profiled"}, status_code=409)
+            await response(scope, receive, send)
+            return
+
+        profile = cProfile.Profile()
+        context_token = _request_profile.set(profile)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                # The endpoint has returned by now, so the profile is complete
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile_store.add(profile)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _request_profile.reset(context_token)
+            self._lock.release()
+
+
+def _profiled(call):
+    """Wrap an endpoint so it runs under the request's profiler, in whichever thread runs it"""
+    if asyncio.iscoroutinefunction(call):
+        @functools.wraps(call)
+        async def async_wrapper(*args, **kwargs):
+            profile = _request_profile.get()
+            if profile is None:
+                return await call(*args, **kwargs)
+            profile.enable()
+            try:
+                return await call(*args, **kwargs)
+            finally:
+                profile.disable()
+        return async_wrapper
+
+    @functools.wraps(call)
+    def wrapper(*args, **kwargs):
+        profile = _request_profile.get()
+        if profile is None:
+            return call(*args, **kwargs)
+        # Sync endpoints run in the threadpool; cProfile only sees the thread it is enabled in
+        profile.enable()
+        try:
+            return call(*args, **kwargs)
+        finally:
+            profile.disable()
+    return wrapper
+
+
+def install_request_profiling(app):
+    """Wrap every endpoint for per-request profiling; call after all routes are registered"""
+    for route in app.routes:
+        if isinstance(route, APIRoute):
+            route.dependant.call = _profiled(route.dependant.call)
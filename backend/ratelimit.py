@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "1") == "1"
+# Per-client token bucket: sustained requests/second and burst size
+RATE_LIMIT_RPS = float(os.getenv("RATE_LIMIT_RPS", "20"))
+RATE_LIMIT_BURST = float(os.getenv("RATE_LIMIT_BURST", "40"))
+# Clients tracked at once; the least recently seen bucket is dropped beyond this
+RATE_LIMIT_MAX_CLIENTS = int(os.getenv("RATE_LIMIT_MAX_CLIENTS", "10000"))
+# Use the first X-Forwarded-For address as the client key (only behind a trusted proxy)
+RATE_LIMIT_TRUST_PROXY = os.getenv("RATE_LIMIT_TRUST_PROXY", "0") == "1"
+
+# Global concurrency limit and how many requests may wait for a slot
+MAX_CONCURRENCY = int(os.getenv("MAX_CONCURRENCY", "64"))
+MAX_QUEUE = int(os.getenv("MAX_QUEUE", "128"))
+QUEUE_TIMEOUT = float(os.getenv("QUEUE_TIMEOUT", "0.5"))  # seconds
+# Switch to degraded mode when smoothed latency passes this
+DEGRADE_LATENCY_MS = float(os.getenv("DEGRADE_LATENCY_MS", "250"))
+LATENCY_EWMA_ALPHA = 0.1
+
+# Health checks are never limited
+EXEMPT_PATHS = {"/", "/api/health"}
+# Still limited, but kept out of the latency average that drives degraded mode:
+# bulk writes and profiling sessions are slow by design, not a sign of overload
+UNTIMED_PREFIXES = ("/api/admin/", "/api/debug/")
+
+
+class RateLimiter:
+    """Per-client token buckets, bounded to RATE_LIMIT_MAX_CLIENTS entries"""
+
+    def __init__(self, rate: float = RATE_LIMIT_RPS, burst: float = RATE_LIMIT_BURST,
+                 max_clients: int = RATE_LIMIT_MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self.buckets: "OrderedDict[str, list]" = OrderedDict()  # key -> [tokens, updated]
+        self.limited = 0
+
+    def allow(self, key: str, now: float) -> Tuple[bool, float]:
+        """Take a token for `key`. Returns (allowed, seconds until the next token)."""
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = [self.burst, now]
+            self.buckets[key] = bucket
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+
+        if bucket[0] >= 1:
+            bucket[0] -= 1
+            return True, 0.0
+        self.limited += 1
+        return False, (1 - bucket[0]) / self.rate
+
+
+class LoadShedder:
+    """Global concurrency limit with a bounded wait queue and latency tracking"""
+
+    def __init__(self, max_concurrency: int = MAX_CONCURRENCY, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT, degrade_latency_ms: float = DEGRADE_LATENCY_MS):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.degrade_latency_ms = degrade_latency_ms
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.latency_ewma_ms = 0.0
+        self.shed = 0
+        self.served_degraded = 0
+
+    @property
+    def degraded(self) -> bool:
+        """True while the service is overloaded; expensive work should use cached results"""
+        return self.latency_ewma_ms > self.degrade_latency_ms or self.waiting > self.max_queue // 2
+
+    async def acquire(self) -> bool:
+        """Wait for a slot. Returns False (shed) if the queue is full or the wait times out."""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self.shed += 1
+            return False
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self.shed += 1
+            return False
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return True
+
+    def release(self, latency_ms: Optional[float]):
+        """Free the slot; latency_ms feeds the degraded-mode average unless None"""
+        self.in_flight -= 1
+        self._semaphore.release()
+        if latency_ms is not None:
+            self.latency_ewma_ms += LATENCY_EWMA_ALPHA * (latency_ms - self.latency_ewma_ms)
+
+
+rate_limiter = RateLimiter()
+load_shedder = LoadShedder()
+
+
+class LoadControlMiddleware:
+    """Rate limit per client (429), then shed load past the concurrency queue (503)"""
+
+    def __init__(self, app, limiter: RateLimiter = rate_limiter, shedder: LoadShedder = load_shedder):
+        self.app = app
+        self.limiter = limiter
+        self.shedder = shedder
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED or scope["path"] in EXEMPT_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        allowed, retry_after = self.limiter.allow(client_key(scope), time.monotonic())
+        if not allowed:
+            response = JSONResponse(
+                {"detail": "Too many requests"},
+                status_code=429,
+                headers={"Retry-After": str(max(1, round(retry_after)))}
+            )
+            await response(scope, receive, send)
+            return
+
+        if not await self.shedder.acquire():
+            response = JSONResponse(
+                {"detail": "Server is overloaded. Please retry shortly."},
+                status_code=503,
+                headers={"Retry-After": "1"}
+            )
+            await response(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            timed = not scope["path"].startswith(UNTIMED_PREFIXES)
+            self.shedder.release((time.perf_counter() - started) * 1000 if timed else None)
+
+
+def client_key(scope) -> str:
+    if RATE_LIMIT_TRUST_PROXY:
+        forwarded = Headers(scope=scope).get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def limiter_stats() -> dict:
+    return {
+        "enabled": RATE_LIMIT_ENABLED,
+        "rate_per_second": rate_limiter.rate,
+        "burst": rate_limiter.burst,
+        "clients_tracked": len(rate_limiter.buckets),
+        "rate_limited": rate_limiter.limited,
+        "max_concurrency": load_shedder.max_concurrency,
+        "in_flight": load_shedder.in_flight,
+        "queued": load_shedder.waiting,
+        "max_queue": load_shedder.max_queue,
+        "shed": load_shedder.shed,
+        "latency_ewma_ms": round(load_shedder.latency_ewma_ms, 2),
+        "degraded": load_shedder.degraded,
+        "served_degraded": load_shedder.served_degraded,
+    }
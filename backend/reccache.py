@@ -0,0 +1,181 @@
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional, Tuple
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import make_url
+
+from database import DATABASE_URL
+
+# Recommendation responses kept in memory per worker
+REC_CACHE_SIZE = int(os.getenv("REC_CACHE_SIZE", "4096"))
+# Shared on-disk tier, read by every worker and kept across restarts ("" disables it).
+# Defaults to rec_cache.db next to the SQLite catalog database.
+REC_CACHE_URL = os.getenv("REC_CACHE_URL")
+# Entries younger than this are served in normal operation; older ones are
+# recomputed so feedback boosts stay fresh (degraded mode ignores the TTL)
+REC_CACHE_TTL = float(os.getenv("REC_CACHE_TTL", "60"))
+# Entries older than this are deleted by the background evictor
+REC_CACHE_MAX_AGE = float(os.getenv("REC_CACHE_MAX_AGE", "86400"))
+REC_CACHE_EVICT_INTERVAL = float(os.getenv("REC_CACHE_EVICT_INTERVAL", "60"))
+
+
+def default_cache_url() -> str:
+    """rec_cache.db in the directory of DATABASE_URL's file ("" for non-file databases)"""
+    url = make_url(DATABASE_URL)
+    if url.get_backend_name() != "sqlite" or not url.database or url.database == ":memory:":
+        return ""
+    return url.set(database=os.path.join(os.path.dirname(url.database), "rec_cache.db")).render_as_string()
+
+
+if REC_CACHE_URL is None:
+    REC_CACHE_URL = default_cache_url()
+
+
+class SharedResponseStore:
+    """Serialized responses in a SQLite table keyed on cache key and catalog version"""
+
+    def __init__(self, url: str):
+        self.engine = create_engine(url, connect_args={"check_same_thread": False})
+
+        # WAL lets readers in every worker proceed while one of them writes
+        @event.listens_for(self.engine, "connect")
+        def _set_pragmas(dbapi_connection, _):
+            cursor = dbapi_connection.cursor()
+            cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.close()
+
+        with self.engine.begin() as conn:
+            conn.exec_driver_sql(
+                """
+                CREATE TABLE IF NOT EXISTS recommendation_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    catalog_version INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    body BLOB NOT NULL
+                )
+                """
+            )
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_recommendation_cache_version "
+                "ON recommendation_cache (catalog_version)"
+            )
+
+    def get(self, key: str) -> Optional[Tuple[float, bytes]]:
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                text("SELECT created_at, body FROM recommendation_cache WHERE cache_key = :key"),
+                {"key": key}
+            ).first()
+        return (row[0], bytes(row[1])) if row else None
+
+    def put(self, key: str, catalog_version: int, created_at: float, body: bytes):
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT OR REPLACE INTO recommendation_cache (cache_key, catalog_version, created_at, body) "
+                    "VALUES (:key, :version, :created_at, :body)"
+                ),
+                {"key": key, "version": catalog_version, "created_at": created_at, "body": body}
+            )
+
+    def evict(self, current_version: int, max_age: float = REC_CACHE_MAX_AGE) -> int:
+        """Delete entries for older catalog versions or past max_age"""
+        with self.engine.begin() as conn:
+            result = conn.execute(
+                text("DELETE FROM recommendation_cache WHERE catalog_version < :version OR created_at < :cutoff"),
+                {"version": current_version, "cutoff": time.time() - max_age}
+            )
+        return result.rowcount
+
+    def count(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(text("SELECT COUNT(*) FROM recommendation_cache")).scalar()
+
+
+class RecommendationCache:
+    """Serialized /api/recommend responses: per-worker LRU in front of a shared store.
+
+    Keys embed the catalog version, so a catalog change never serves stale
+    items; bodies are final JSON bytes, so a hit skips scoring and serialization.
+    """
+
+    def __init__(self, maxsize: int = REC_CACHE_SIZE, shared_url: str = REC_CACHE_URL):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, Tuple[float, bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.shared = SharedResponseStore(shared_url) if shared_url else None
+        self.memory_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def get(self, key: str, max_age: Optional[float] = REC_CACHE_TTL) -> Tuple[Optional[bytes], str]:
+        """Cached body no older than max_age (None: any age) and the tier it came from"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None and (max_age is None or now - entry[0] <= max_age):
+            self.memory_hits += 1
+            return entry[1], "memory"
+
+        if self.shared is not None:
+            entry = self.shared.get(key)
+            if entry is not None and (max_age is None or now - entry[0] <= max_age):
+                self._remember(key, entry)
+                self.shared_hits += 1
+                return entry[1], "shared"
+
+        self.misses += 1
+        return None, "miss"
+
+    def put(self, key: str, catalog_version: int, body: bytes):
+        entry = (time.time(), body)
+        self._remember(key, entry)
+        if self.shared is not None:
+            self.shared.put(key, catalog_version, entry[0], body)
+
+    def evict(self, current_version: int):
+        if self.shared is not None:
+            self.evicted += self.shared.evict(current_version)
+
+    def clear_memory(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, entry: Tuple[float, bytes]):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "shared_entries": self.shared.count() if self.shared is not None else 0,
+            "memory_hits": self.memory_hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+recommendation_cache = RecommendationCache()
+
+
+async def evict_periodically(current_version: Callable[[], int]):
+    """Background task: drop shared entries for superseded catalog versions"""
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(REC_CACHE_EVICT_INTERVAL)
+        try:
+            await loop.run_in_executor(None, lambda: recommendation_cache.evict(current_version()))
+        except Exception as e:
+            print(f"Error evicting recommendation cache: {e}")
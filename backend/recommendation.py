@@ -1,167 +1,250 @@
-from typing import List, Tuple
+import random
+from itertools import product
+from typing import FrozenSet, Iterable, List, NamedTuple, Optional, Tuple
 from sqlalchemy.orm import Session
-from models import FoodItem
-from schemas import QuizAnswers
+from catalog import CatalogItem, CatalogSnapshot, get_catalog
+from schemas import DietaryFilters, QuizAnswers
+from feedback import feedback_pipeline
+from vocabulary import vocabulary
+from context import CONTEXT_BOOST, context_names, context_tag_mask
+from dietary import select
+from tenants import DEFAULT_TENANT
+from tracing import span
 
-def quiz_to_tags(answers: QuizAnswers) -> List[str]:
-    """Convert quiz answers to searchable tags"""
-    tags = []
-    
+# Each quiz dimension is discretized into a bucket; each bucket maps to the
+# tags it contributes. The full cross product is compiled once at import and
+# quiz_bucket_index() turns answers into a row of that table.
+
+QUIZ_DIMENSIONS = [
+    ("hunger", [
+        ["hunger_low", "light", "snack"],
+        ["hunger_medium", "regular"],
+        ["hunger_high", "filling", "heavy"],
+    ]),
+    ("budget", [
+        ["budget_low", "cheap", "affordable"],
+        ["budget_medium", "moderate_price"],
+        ["budget_high", "premium", "expensive"],
+    ]),
+    ("healthiness", [
+        ["healthy", "nutritious", "light"],
+        ["indulgent", "comfort", "rich"],
+        ["balanced"],
+    ]),
+    ("temperature", [
+        ["cold", "chilled", "refreshing"],
+        ["hot", "warm", "steaming"],
+        ["room_temp"],
+    ]),
+    ("spice", [
+        ["spice_none", "mild", "no_spice"],
+        ["spice_mild", "slightly_spicy"],
+        ["spice_medium", "spicy"],
+        ["spice_hot", "very_spicy", "fiery"],
+    ]),
+    ("social", [
+        ["solo", "single_serving", "quick"],
+        ["date", "romantic", "shareable"],
+        ["group", "shareable", "party", "family"],
+    ]),
+    ("vibe", [
+        ["hangover", "comfort", "greasy", "carbs", "recovery"],
+        ["stressed", "comfort", "quick", "easy"],
+        ["lazy", "easy", "delivery", "no_effort"],
+        ["happy", "celebratory", "treat", "special"],
+    ]),
+]
+
+
+class QuizTags(NamedTuple):
+    """Pre-built tag set for one combination of quiz buckets"""
+    names: Tuple[str, ...]  # tags in quiz order, duplicates kept
+    ids: FrozenSet[int]  # interned tag ids
+    mask: int  # bitmask of `ids`
+    score_by_matches: Tuple[float, ...]  # match score indexed by matched-tag count
+    dimension_masks: Tuple[Tuple[str, int], ...]  # (quiz field, tag mask) per dimension
+
+
+def _match_score(matched: int, total: int) -> float:
+    # Percentage of user tags matched + bonus for food-specific matches
+    if total == 0:
+        return 0.0
+    return round(min(matched / total * 100 + matched * 2, 100), 1)
+
+
+def _compile_quiz_table() -> Tuple[List[int], List[QuizTags]]:
+    strides = []
+    stride = 1
+    for _, buckets in reversed(QUIZ_DIMENSIONS):
+        strides.append(stride)
+        stride *= len(buckets)
+    strides.reverse()
+
+    dimension_names = [dimension for dimension, _ in QUIZ_DIMENSIONS]
+    table = []
+    for combination in product(*(buckets for _, buckets in QUIZ_DIMENSIONS)):
+        names = tuple(vocabulary.name(vocabulary.intern(tag)) for tags in combination for tag in tags)
+        ids = vocabulary.id_set(names)
+        table.append(QuizTags(
+            names=names,
+            ids=ids,
+            mask=vocabulary.mask(names),
+            score_by_matches=tuple(_match_score(n, len(ids)) for n in range(len(ids) + 1)),
+            dimension_masks=tuple(
+                (dimension, vocabulary.mask(tags)) for dimension, tags in zip(dimension_names, combination)
+            ),
+        ))
+    return strides, table
+
+
+QUIZ_STRIDES, QUIZ_TABLE = _compile_quiz_table()
+
+
+(HUNGER_STRIDE, BUDGET_STRIDE, HEALTHINESS_STRIDE, TEMPERATURE_STRIDE,
+ SPICE_STRIDE, SOCIAL_STRIDE, VIBE_STRIDE) = QUIZ_STRIDES
+
+BUDGET_BUCKETS = {"broke": 0, "moderate": 1}  # anything else: balling
+SOCIAL_BUCKETS = {"solo": 0, "date": 1}  # anything else: group
+VIBE_BUCKETS = {"hangover": 0, "stressed": 1, "lazy": 2}  # anything else: happy
+
+def quiz_bucket_index(answers: QuizAnswers) -> int:
+    """Row of QUIZ_TABLE for these answers; bucket order matches QUIZ_DIMENSIONS"""
     # Hunger level (0-100)
-    if answers.hunger < 33:
-        tags.append("hunger_low")
-        tags.append("light")
-        tags.append("snack")
-    elif answers.hunger < 66:
-        tags.append("hunger_medium")
-        tags.append("regular")
-    else:
-        tags.append("hunger_high")
-        tags.append("filling")
-        tags.append("heavy")
-    
+    hunger = answers.hunger
+    index = (0 if hunger < 33 else 1 if hunger < 66 else 2) * HUNGER_STRIDE
+
     # Budget
-    if answers.budget == "broke":
-        tags.append("budget_low")
-        tags.append("cheap")
-        tags.append("affordable")
-    elif answers.budget == "moderate":
-        tags.append("budget_medium")
-        tags.append("moderate_price")
-    else:  # balling
-        tags.append("budget_high")
-        tags.append("premium")
-        tags.append("expensive")
-    
+    index += BUDGET_BUCKETS.get(answers.budget, 2) * BUDGET_STRIDE
+
     # Healthiness (0-100, lower = healthier)
-    if answers.healthiness < 40:
-        tags.append("healthy")
-        tags.append("nutritious")
-        tags.append("light")
-    elif answers.healthiness > 60:
-        tags.append("indulgent")
-        tags.append("comfort")
-        tags.append("rich")
-    else:
-        tags.append("balanced")
-    
+    healthiness = answers.healthiness
+    index += (0 if healthiness < 40 else 1 if healthiness > 60 else 2) * HEALTHINESS_STRIDE
+
     # Temperature preference (0-100, lower = cold)
-    if answers.temperature < 40:
-        tags.append("cold")
-        tags.append("chilled")
-        tags.append("refreshing")
-    elif answers.temperature > 60:
-        tags.append("hot")
-        tags.append("warm")
-        tags.append("steaming")
-    else:
-        tags.append("room_temp")
-    
+    temperature = answers.temperature
+    index += (0 if temperature < 40 else 1 if temperature > 60 else 2) * TEMPERATURE_STRIDE
+
     # Spice level (0-5)
-    if answers.spice == 0:
-        tags.append("spice_none")
-        tags.append("mild")
-        tags.append("no_spice")
-    elif answers.spice <= 2:
-        tags.append("spice_mild")
-        tags.append("slightly_spicy")
-    elif answers.spice <= 4:
-        tags.append("spice_medium")
-        tags.append("spicy")
-    else:  # 5
-        tags.append("spice_hot")
-        tags.append("very_spicy")
-        tags.append("fiery")
-    
-    # Social setting
-    if answers.social == "solo":
-        tags.append("solo")
-        tags.append("single_serving")
-        tags.append("quick")
-    elif answers.social == "date":
-        tags.append("date")
-        tags.append("romantic")
-        tags.append("shareable")
-    else:  # group
-        tags.append("group")
-        tags.append("shareable")
-        tags.append("party")
-        tags.append("family")
-    
-    # Vibe/Mood
-    if answers.vibe == "hangover":
-        tags.append("hangover")
-        tags.append("comfort")
-        tags.append("greasy")
-        tags.append("carbs")
-        tags.append("recovery")
-    elif answers.vibe == "stressed":
-        tags.append("stressed")
-        tags.append("comfort")
-        tags.append("quick")
-        tags.append("easy")
-    elif answers.vibe == "lazy":
-        tags.append("lazy")
-        tags.append("easy")
-        tags.append("delivery")
-        tags.append("no_effort")
-    else:  # happy
-        tags.append("happy")
-        tags.append("celebratory")
-        tags.append("treat")
-        tags.append("special")
-    
-    return tags
+    spice = answers.spice
+    index += (0 if spice == 0 else 1 if spice <= 2 else 2 if spice <= 4 else 3) * SPICE_STRIDE
+
+    # Social setting and vibe/mood
+    index += SOCIAL_BUCKETS.get(answers.social, 2) * SOCIAL_STRIDE
+    index += VIBE_BUCKETS.get(answers.vibe, 3) * VIBE_STRIDE
+    return index
+
+def compile_quiz(answers: QuizAnswers) -> QuizTags:
+    """Pre-built tag set for quiz answers (a table lookup)"""
+    return QUIZ_TABLE[quiz_bucket_index(answers)]
+
+def quiz_to_tags(answers: QuizAnswers) -> List[str]:
+    """Convert quiz answers to searchable tags"""
+    return list(compile_quiz(answers).names)
 
 def calculate_match_score(food_tags: List[str], user_tags: List[str]) -> Tuple[float, List[str]]:
     """Calculate how well a food item matches user preferences"""
-    food_tags_set = set(tag.lower() for tag in food_tags)
-    user_tags_set = set(tag.lower() for tag in user_tags)
-    
-    # Find matching tags
-    matched_tags = list(food_tags_set.intersection(user_tags_set))
-    
-    # Calculate score (percentage of user tags matched + bonus for food-specific matches)
-    if len(user_tags_set) == 0:
-        return 0.0, []
-    
-    # Base score from matched tags
-    base_score = len(matched_tags) / len(user_tags_set) * 100
-    
-    # Bonus for having more specific matches
-    bonus = len(matched_tags) * 2
-    
-    final_score = min(base_score + bonus, 100)
-    
-    return round(final_score, 1), matched_tags
-
-def get_recommendations(db: Session, answers: QuizAnswers, limit: int = 3) -> List[Tuple[FoodItem, float, List[str]]]:
-    """Get top food recommendations based on quiz answers"""
-    
-    # Convert quiz answers to tags
-    user_tags = quiz_to_tags(answers)
-    
-    # Get all food items
-    all_foods = db.query(FoodItem).all()
-    
+    food_mask = vocabulary.mask(food_tags)
+    user_mask = vocabulary.mask(user_tags)
+    matched = food_mask & user_mask
+    return _match_score(matched.bit_count(), user_mask.bit_count()), vocabulary.names(matched)
+
+def score_foods(foods: Iterable[CatalogItem], answers: QuizAnswers, context: int = 0) -> List[Tuple[CatalogItem, float, int]]:
+    """Score food items against quiz answers, keeping only items with some match.
+
+    `context` holds request context bits (see context.request_context); items
+    eligible for an active context get CONTEXT_BOOST points per context.
+    Returns (food, score, matched tag mask) tuples; scoring only needs the
+    matched-tag count, names are resolved by explain_match() when asked for.
+    """
+
+    # Pre-built tags for these answers
+    with span("quiz_to_tags"):
+        quiz = compile_quiz(answers)
+    user_mask = quiz.mask
+    score_by_matches = quiz.score_by_matches
+
     # Calculate scores for each food item
     scored_foods = []
-    for food in all_foods:
-        score, matched_tags = calculate_match_score(food.tags, user_tags)
-        if score > 0:  # Only include items with some match
-            scored_foods.append((food, score, matched_tags))
-    
+    for food in foods:
+        matched = food.tag_mask & user_mask
+        if matched:  # Only include items with some match
+            score = score_by_matches[matched.bit_count()]
+            # Nudge by thumbs-up/down feedback for the item and its tags
+            boost = feedback_pipeline.popularity_boost(food.id, food.tags)
+            # Time-of-day / day-of-week fit, precomputed per item as context bits
+            context_hits = food.context_mask & context
+            if context_hits:
+                boost += CONTEXT_BOOST * context_hits.bit_count()
+            score = round(max(0.0, min(score + boost, 100)), 1)
+            scored_foods.append((food, score, matched))
+    return scored_foods
+
+def get_recommendations(
+    db: Session, answers: QuizAnswers, limit: int = 3, context: int = 0, tenant: str = DEFAULT_TENANT,
+    catalog: Optional[CatalogSnapshot] = None
+) -> List[Tuple[CatalogItem, float, int]]:
+    """Get top food recommendations from a tenant's catalog based on quiz answers (see score_foods).
+
+    Pass `catalog` to score against a snapshot the caller already holds.
+    """
+
+    # Catalog snapshot with interned tag bitmasks
+    if catalog is None:
+        catalog = get_catalog(db, tenant)
+
+    # Dietary constraints are one bitset intersection, applied before scoring
+    mask = catalog.dietary.mask(answers)
+    foods = catalog.items if mask is None else select(catalog.items, mask)
+
+    with span("scoring") as scoring:
+        scored_foods = score_foods(foods, answers, context)
+        scoring.set("items", len(foods))
+
     # Sort by score (highest first)
-    scored_foods.sort(key=lambda x: x[1], reverse=True)
-    
+    with span("sorting"):
+        scored_foods.sort(key=lambda x: x[1], reverse=True)
+
     # Return top N recommendations
     return scored_foods[:limit]
 
-def get_random_fallback(db: Session) -> FoodItem:
-    """Get a random food item as fallback"""
-    import random
-    all_foods = db.query(FoodItem).all()
-    if all_foods:
-        return random.choice(all_foods)
-    return None
+def explain_match(food: CatalogItem, answers: QuizAnswers, matched: int, context: int = 0) -> dict:
+    """Break a match down into the tags each quiz answer and the request context contributed"""
+    quiz = compile_quiz(answers)
+    contributions = []
+    for dimension, dimension_mask in quiz.dimension_masks:
+        dimension_matched = matched & dimension_mask
+        if dimension_matched:
+            contributions.append({
+                "dimension": dimension,
+                "answer": str(getattr(answers, dimension)),
+                "matched_tags": vocabulary.names(dimension_matched),
+            })
+    context_hits = food.context_mask & context
+    if context_hits:
+        contributions.append({
+            "dimension": "context",
+            "answer": ", ".join(context_names(context)),
+            "matched_tags": vocabulary.names(food.tag_mask & context_tag_mask(context_hits)),
+        })
+    matched_count = matched.bit_count()
+    return {
+        "matched_count": matched_count,
+        "total_tags": len(quiz.ids),
+        "base_score": quiz.score_by_matches[matched_count],
+        "feedback_boost": round(feedback_pipeline.popularity_boost(food.id, food.tags), 1),
+        "context_boost": CONTEXT_BOOST * context_hits.bit_count(),
+        "contributions": contributions,
+    }
 
+def get_random_fallback(
+    db: Session, filters: Optional[DietaryFilters] = None, tenant: str = DEFAULT_TENANT,
+    catalog: Optional[CatalogSnapshot] = None
+) -> Optional[CatalogItem]:
+    """Get a random food item as fallback, respecting dietary filters if given"""
+    if catalog is None:
+        catalog = get_catalog(db, tenant)
+    mask = catalog.dietary.mask(filters) if filters is not None else None
+    items = catalog.items if mask is None else select(catalog.items, mask)
+    if items:
+        return random.choice(items)
+    return None
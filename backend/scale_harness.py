@@ -0,0 +1,156 @@
+"""Run the API hot paths against synthetic catalogs of increasing size.
+
+Usage: python scale_harness.py [--sizes 1000,10000,100000,1000000] [--requests N] [--dir DIR]
+
+Each size gets its own database in --dir (generated by synth_catalog.py on
+first use) and its own worker process, so RSS reflects that catalog alone.
+Workers call the endpoint functions in-process, with the response cache
+disabled, and report latency percentiles, snapshot load time, RSS and DB size.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SEARCH_QUERIES = ["bir", "paneer", "spicy noodles", "pizza", "sweet", "chi", "burger", "soup"]
+
+
+def rss_mb() -> float:
+    """Resident set size of this process in MB (Linux)"""
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def percentile(values, pct: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+def timed(calls) -> dict:
+    latencies = []
+    for call in calls:
+        started = time.perf_counter()
+        call()
+        latencies.append((time.perf_counter() - started) * 1000)
+    return {
+        "p50": round(statistics.median(latencies), 3),
+        "p99": round(percentile(latencies, 99), 3),
+    }
+
+
+def run_worker(requests: int) -> dict:
+    """Measure the current DATABASE_URL; runs inside the per-size subprocess"""
+    from fastapi import Response
+
+    import main as api
+    from catalog import get_catalog
+    from database import SessionLocal
+    from reccache import RecommendationCache
+    from schemas import DietaryFilters, QuizAnswers
+    from tenants import DEFAULT_TENANT
+
+    api.recommendation_cache = RecommendationCache(maxsize=0, shared_url="")
+    rng = random.Random(42)
+    answers = [
+        QuizAnswers(
+            hunger=rng.randint(0, 100),
+            budget=rng.choice(["broke", "moderate", "balling"]),
+            healthiness=rng.randint(0, 100),
+            temperature=rng.randint(0, 100),
+            spice=rng.randint(0, 5),
+            social=rng.choice(["solo", "date", "group"]),
+            vibe=rng.choice(["hangover", "stressed", "lazy", "happy"]),
+        )
+        for _ in range(requests)
+    ]
+
+    def recommend(quiz):
+        def call():
+            result = api.get_recommendation(
+                quiz, db=db, explain=False, fields=None, x_timezone=None, tenant=DEFAULT_TENANT
+            )
+            assert isinstance(result, Response)
+        return call
+
+    db = SessionLocal()
+    try:
+        rss_before = rss_mb()
+        snapshot = get_catalog(db)
+        results = {
+            "items": len(snapshot.items),
+            "snapshot_load_ms": snapshot.load_ms,
+            "snapshot_rss_mb": round(rss_mb() - rss_before, 1),
+            "recommend": timed([recommend(quiz) for quiz in answers]),
+            "foods": timed([lambda: api.get_all_foods(
+                db=db, cuisine=None, filters=DietaryFilters(), tenant=DEFAULT_TENANT, limit=50, fields=None
+            )] * requests),
+            "cuisines": timed([lambda: api.get_cuisines(tenant=DEFAULT_TENANT, db=db)] * requests),
+            "search": timed([
+                (lambda q=q: api.search(q=q, limit=10, answers=None, x_timezone=None, tenant=DEFAULT_TENANT, db=db))
+                for q in (SEARCH_QUERIES * (requests // len(SEARCH_QUERIES) + 1))[:requests]
+            ]),
+            "rss_mb": round(rss_mb(), 1),
+        }
+    finally:
+        db.close()
+    return results
+
+
+def ensure_database(path: str, size: int):
+    if os.path.exists(path):
+        return
+    print(f"Generating {size} items into {path} ...", flush=True)
+    subprocess.run(
+        [sys.executable, os.path.join(HERE, "synth_catalog.py"), "--count", str(size), "--database", path],
+        check=True, cwd=HERE,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="1000,10000,100000,1000000", help="comma-separated catalog sizes")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and size")
+    parser.add_argument("--dir", default="scale_dbs", help="where the generated databases live")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(run_worker(args.requests)))
+        return
+
+    os.makedirs(args.dir, exist_ok=True)
+    for size in [int(size) for size in args.sizes.split(",")]:
+        path = os.path.abspath(os.path.join(args.dir, f"food_{size}.db"))
+        ensure_database(path, size)
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{path}", REC_CACHE_URL="")
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", "--requests", str(args.requests)],
+            check=True, capture_output=True, text=True, cwd=HERE, env=env,
+        ).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result["db_mb"] = round(os.path.getsize(path) / 1024 / 1024, 1)
+
+        print(
+            f"{result['items']:>10} items  db {result['db_mb']:8.1f} MB  rss {result['rss_mb']:8.1f} MB  "
+            f"snapshot {result['snapshot_load_ms']:10.1f} ms (+{result['snapshot_rss_mb']} MB)",
+            flush=True,
+        )
+        for endpoint in ("recommend", "foods", "cuisines", "search"):
+            timing = result[endpoint]
+            print(f"    {endpoint:<10} p50 {timing['p50']:10.3f} ms  p99 {timing['p99']:10.3f} ms", flush=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,20 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, field_validator
+from typing import List, Literal, Optional
 
-# Quiz answers from frontend
-class QuizAnswers(BaseModel):
+# Dietary claims an item can carry; set explicitly by an operator, never inferred from tags
+Claim = Literal["vegan", "nut_free", "gluten_free"]
+
+# Hard dietary constraints; unset fields do not filter
+class DietaryFilters(BaseModel):
+    vegetarian: bool = False
+    vegan: bool = False
+    nut_free: bool = False  # only items claimed nut_free
+    gluten_free: bool = False  # only items claimed gluten_free
+    max_price: Optional[int] = None
+    max_spice: Optional[int] = None  # 0-5
+
+# Quiz answers from frontend, optionally with dietary constraints
+class QuizAnswers(DietaryFilters):
     hunger: int  # 0-100
     budget: str  # broke, moderate, balling
     healthiness: int  # 0-100
@@ -24,24 +36,216 @@ class FoodItemResponse(BaseModel):
     is_vegetarian: bool
     serving_size: str
     temperature: str
+    claims: List[str] = []
     
     class Config:
         from_attributes = True
 
+    @field_validator("claims", mode="before")
+    @classmethod
+    def no_claims(cls, value):
+        # Rows from before the claims column hold NULL
+        return value or []
+
+# Admin: create a food item (or upsert when `id` is given in bulk writes)
+class FoodItemCreate(BaseModel):
+    id: Optional[int] = None
+    name: str
+    emoji: str
+    cuisine: str
+    tags: List[str]
+    avg_price: int = 200
+    description: Optional[str] = None
+    spice_level: int = 0
+    is_vegetarian: bool = False
+    serving_size: str = "regular"
+    temperature: str = "hot"
+    claims: List[Claim] = []
+
+# Admin: partial update of a food item
+class FoodItemUpdate(BaseModel):
+    name: Optional[str] = None
+    emoji: Optional[str] = None
+    cuisine: Optional[str] = None
+    tags: Optional[List[str]] = None
+    avg_price: Optional[int] = None
+    description: Optional[str] = None
+    spice_level: Optional[int] = None
+    is_vegetarian: Optional[bool] = None
+    serving_size: Optional[str] = None
+    temperature: Optional[str] = None
+    claims: Optional[List[Claim]] = None
+
+    @field_validator("name", "emoji", "cuisine", "tags", "avg_price", "spice_level",
+                     "is_vegetarian", "serving_size", "temperature", "claims")
+    @classmethod
+    def not_null(cls, value):
+        # Omit a field to leave it unchanged; only description can be cleared
+        if value is None:
+            raise ValueError("may be omitted but not null")
+        return value
+
+# Admin: bulk delete
+class BulkDeleteRequest(BaseModel):
+    ids: List[int]
+
+class ChunkTiming(BaseModel):
+    chunk: int
+    rows: int
+    ms: float
+
+# Admin: result of a bulk write
+class BulkWriteResponse(BaseModel):
+    inserted: int
+    updated: int
+    deleted: int
+    catalog_version: int
+    chunks: List[ChunkTiming]
+    total_ms: float
+
+# Admin: result of a single delete
+class DeleteResponse(BaseModel):
+    deleted: int
+    catalog_version: int
+
+# Tags a single quiz answer contributed to a match
+class ScoreContribution(BaseModel):
+    dimension: str  # quiz field, e.g. hunger, vibe
+    answer: str
+    matched_tags: List[str]
+
+# Breakdown of a match score (only with ?explain=true)
+class MatchExplanation(BaseModel):
+    matched_count: int
+    total_tags: int
+    base_score: float
+    feedback_boost: float
+    context_boost: float
+    contributions: List[ScoreContribution]
+
 # Recommendation with score
 class RecommendationWithScore(BaseModel):
     food: FoodItemResponse
     score: float
-    matched_tags: List[str]
+    matched_count: int = 0
+    matched_tags: Optional[List[str]] = None  # only with ?explain=true
+    explanation: Optional[MatchExplanation] = None
 
 # API Response for recommendations
 class RecommendationResponse(BaseModel):
     best_match: FoodItemResponse
     score: float
-    matched_tags: List[str]
+    matched_count: int = 0
+    matched_tags: Optional[List[str]] = None  # only with ?explain=true
+    explanation: Optional[MatchExplanation] = None
     alternatives: List[RecommendationWithScore]
     total_matches: int
 
+# Thumbs-up/down feedback on a recommendation
+class FeedbackRequest(BaseModel):
+    food_id: int
+    vote: str  # up, down
+
+# Feedback ingestion response
+class FeedbackResponse(BaseModel):
+    status: str
+    queued: int
+
+# Feedback pipeline counters
+class FeedbackStatsResponse(BaseModel):
+    queued: int
+    capacity: int
+    accepted: int
+    dropped: int
+    written: int
+    skipped: int
+    batches: int
+    last_flush_ms: float
+
+# Trace exporter counters (only with TRACING_ENABLED=1)
+class TraceStatsResponse(BaseModel):
+    queued: int
+    exported: int
+    dropped: int
+    failed: int
+    batches: int
+
+# Catalog change feed
+class CatalogVersionResponse(BaseModel):
+    version: int
+
+class CatalogChangeEntry(BaseModel):
+    version: int
+    food_id: int
+    op: str  # upsert, delete
+
+class CatalogChangesResponse(BaseModel):
+    version: int
+    reset: bool  # True when the log was pruned past `since`; reload everything
+    changes: List[CatalogChangeEntry]
+
+# Per-tenant catalog snapshots loaded in a worker
+class TenantCatalog(BaseModel):
+    tenant: str
+    version: int
+    items: int
+    size_mb: float  # estimated
+    load_ms: float
+
+class TenantCatalogsResponse(BaseModel):
+    budget_mb: float
+    loaded_mb: float
+    evictions: int
+    refreshes: int  # background snapshot rebuilds
+    last_refresh_ms: float
+    tenants: List[TenantCatalog]
+
+# Recommendation cache counters (memory tier and shared on-disk tier)
+class CacheStats(BaseModel):
+    entries: int
+    shared_entries: int
+    memory_hits: int
+    shared_hits: int
+    misses: int
+    evicted: int
+
+# Rate limiter / load shedder state
+class LimiterStatsResponse(BaseModel):
+    enabled: bool
+    rate_per_second: float
+    burst: float
+    clients_tracked: int
+    rate_limited: int
+    max_concurrency: int
+    in_flight: int
+    queued: int
+    max_queue: int
+    shed: int
+    latency_ewma_ms: float
+    degraded: bool
+    served_degraded: int
+    cache: CacheStats
+
+# Search hit; score is set when quiz answers are passed for ranking
+class SearchResult(BaseModel):
+    food: FoodItemResponse
+    rank: float  # bm25, lower is better
+    score: Optional[float] = None
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+    took_ms: float
+
+# "More like this" neighbor of a food item
+class SimilarFood(BaseModel):
+    food: FoodItemResponse
+    similarity: float  # tag Jaccard, 0-1
+
+class SimilarFoodsResponse(BaseModel):
+    food_id: int
+    results: List[SimilarFood]
+
 # Health check response
 class HealthResponse(BaseModel):
     status: str
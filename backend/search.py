@@ -0,0 +1,99 @@
+import re
+import time
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+# External-content FTS5 index over food_items; prefix indexes make typeahead
+# queries ("bir" -> biryani) index lookups instead of scans
+FTS_TABLE = "food_items_fts"
+
+CREATE_FTS = f"""
+CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+    name, description, cuisine, tags,
+    content='food_items', content_rowid='id',
+    prefix='1 2 3',
+    tokenize='unicode61 remove_diacritics 2'
+)
+"""
+
+TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS food_items_fts_insert AFTER INSERT ON food_items
+    BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, description, cuisine, tags)
+        VALUES (NEW.id, NEW.name, NEW.description, NEW.cuisine, NEW.tags);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS food_items_fts_delete AFTER DELETE ON food_items
+    BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, description, cuisine, tags)
+        VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.cuisine, OLD.tags);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS food_items_fts_update AFTER UPDATE ON food_items
+    BEGIN
+        INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rowid, name, description, cuisine, tags)
+        VALUES ('delete', OLD.id, OLD.name, OLD.description, OLD.cuisine, OLD.tags);
+        INSERT INTO {FTS_TABLE} (rowid, name, description, cuisine, tags)
+        VALUES (NEW.id, NEW.name, NEW.description, NEW.cuisine, NEW.tags);
+    END
+    """,
+]
+
+# Column weights for bm25(): name matches count most
+BM25_WEIGHTS = "10.0, 2.0, 3.0, 1.0"
+# Text hits fetched per result when quiz answers re-rank them
+SEARCH_RERANK_POOL = 5
+
+TOKEN_PATTERN = re.compile(r"\w+", re.UNICODE)
+
+
+def install_search_index(engine: Engine):
+    """Create the FTS index and its sync triggers; backfills it from food_items on first run"""
+    with engine.begin() as conn:
+        exists = conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": FTS_TABLE}
+        ).first()
+        if not exists:
+            conn.exec_driver_sql(CREATE_FTS)
+            conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+        for trigger in TRIGGERS:
+            conn.exec_driver_sql(trigger)
+
+
+def rebuild_search_index(engine: Engine):
+    """Re-index every row, e.g. after a bulk load that bypassed the triggers"""
+    with engine.begin() as conn:
+        conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def to_match_query(query: str) -> str:
+    """Turn free text into an FTS5 query where every word is a prefix match"""
+    tokens = TOKEN_PATTERN.findall(query.lower())
+    return " ".join(f'"{token}"*' for token in tokens)
+
+
+def search_foods(conn: Connection, query: str, limit: int = 10, tenant: Optional[str] = None) -> Tuple[List[Tuple[int, float]], float]:
+    """Matching food ids (of one tenant, if given) with their bm25 rank (lower is better), and the query time in ms"""
+    match = to_match_query(query)
+    if not match or limit < 1:
+        return [], 0.0
+    started = time.perf_counter()
+    sql = f"SELECT {FTS_TABLE}.rowid, bm25({FTS_TABLE}, {BM25_WEIGHTS}) AS rank FROM {FTS_TABLE} "
+    params = {"match": match, "limit": limit}
+    if tenant is None:
+        sql += f"WHERE {FTS_TABLE} MATCH :match "
+    else:
+        # One index for all tenants; the join keeps only this tenant's rows
+        sql += (
+            f"JOIN food_items ON food_items.id = {FTS_TABLE}.rowid "
+            f"WHERE {FTS_TABLE} MATCH :match AND food_items.tenant = :tenant "
+        )
+        params["tenant"] = tenant
+    rows = conn.execute(text(sql + "ORDER BY rank LIMIT :limit"), params).all()
+    return [(row[0], row[1]) for row in rows], round((time.perf_counter() - started) * 1000, 3)
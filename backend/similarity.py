@@ -0,0 +1,439 @@
+"""Precomputed "more like this": each item's top-K most similar items by tag Jaccard.
+
+Usage: python similarity.py [--tenant TENANT ...] [--verify]
+
+Running this module rebuilds the neighbor table of the given tenants (all by
+default) in full; the API keeps it current afterwards, as the catalog refresher
+publishes snapshots, by recomputing only the rows a change can affect. With
+--verify it rebuilds nothing and reports the rows that differ from a rebuild.
+
+Candidates come from an inverted index over tags rather than a scan of the
+catalog. Items with identical tag sets are grouped (they are each other's
+nearest neighbors) and candidate groups are collected from the postings of a
+group's rarest tags first, up to SIMILAR_CANDIDATES groups, so the build stays
+near-linear however common some tags are.
+
+Under that cap stored rows are approximate: which groups a common tag
+contributes depends on the catalog around it, so after incremental updates a
+few rows can differ from what a rebuild would store. The API rebuilds a tenant
+in full at its first change after SIMILAR_REBUILD_INTERVAL to clear that drift.
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from itertools import islice
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import delete, select, text
+from sqlalchemy.engine import Connection
+
+from catalog import CatalogSnapshot, load_snapshot
+from changefeed import get_changes_since
+from database import Base, SessionLocal, engine
+from models import FoodNeighbors, NeighborVersion, TenantVersion
+
+# Neighbors stored per item
+SIMILAR_TOP_K = int(os.getenv("SIMILAR_TOP_K", "10"))
+# Candidate tag-set groups scored per item
+SIMILAR_CANDIDATES = int(os.getenv("SIMILAR_CANDIDATES", "500"))
+# More changed items than this since the last update means a full rebuild
+SIMILAR_INCREMENTAL_MAX = int(os.getenv("SIMILAR_INCREMENTAL_MAX", "1000"))
+# Full rebuilds of larger tenants are left to running this module offline
+SIMILAR_AUTO_BUILD_MAX_ITEMS = int(os.getenv("SIMILAR_AUTO_BUILD_MAX_ITEMS", "100000"))
+# Seconds after which a tenant's next change triggers a full rebuild instead of an update
+SIMILAR_REBUILD_INTERVAL = float(os.getenv("SIMILAR_REBUILD_INTERVAL", "86400"))
+
+SCORE_SCALE = 10000  # similarities are stored as uint16 in 1/10000ths
+WRITE_CHUNK = 5000
+
+Neighbors = List[Tuple[int, float]]
+TagsById = Dict[int, Tuple[int, FrozenSet[int]]]  # food id -> (tag mask, tag ids)
+
+
+def pack(neighbors: Neighbors) -> bytes:
+    """(id, similarity) pairs as 6 bytes each: all uint32 ids, then all uint16 similarities"""
+    ids = array("I", [food_id for food_id, _ in neighbors])
+    scores = array("H", [round(score * SCORE_SCALE) for _, score in neighbors])
+    return ids.tobytes() + scores.tobytes()
+
+
+def unpack(blob: bytes) -> Neighbors:
+    count = len(blob) // 6
+    ids, scores = array("I"), array("H")
+    ids.frombytes(blob[:count * 4])
+    scores.frombytes(blob[count * 4:])
+    return [(food_id, score / SCORE_SCALE) for food_id, score in zip(ids, scores)]
+
+
+class TagIndex:
+    """A snapshot's items grouped by identical tag set, with postings from tag id to groups"""
+
+    def __init__(self, items: Iterable):
+        groups: Dict[int, List[int]] = {}
+        tag_ids = {}
+        for item in items:
+            if not item.tag_mask:
+                continue  # untagged items are similar to nothing
+            if item.tag_mask not in groups:
+                groups[item.tag_mask] = []
+                tag_ids[item.tag_mask] = item.tag_ids
+            groups[item.tag_mask].append(item.id)
+
+        self.masks = list(groups)
+        self.members = [groups[mask] for mask in self.masks]  # item ids, ascending
+        self.group_of = {mask: group for group, mask in enumerate(self.masks)}
+        self.tags = [tag_ids[mask] for mask in self.masks]
+        self.postings: Dict[int, List[int]] = {}
+        for group, tags in enumerate(self.tags):
+            for tag in tags:
+                self.postings.setdefault(tag, []).append(group)
+
+    def candidates(self, tag_ids: Iterable[int], near: int, limit: int = SIMILAR_CANDIDATES) -> Set[int]:
+        """Groups sharing a tag, from the rarest tags' postings first, at most `limit`"""
+        candidates: Set[int] = set()
+        for tag in sorted(tag_ids, key=lambda tag: len(self.postings.get(tag, ()))):
+            budget = limit - len(candidates)
+            if budget <= 0:
+                break
+            posting = self.postings.get(tag, [])
+            if len(posting) > budget:
+                # Too common to take whole: the groups nearest `near` in the posting
+                start = min(max(bisect_left(posting, near) - budget // 2, 0), len(posting) - budget)
+                posting = posting[start:start + budget]
+            candidates.update(posting)
+        return candidates
+
+    def ranked(self, group: int, limit: int = SIMILAR_CANDIDATES) -> List[Tuple[float, int]]:
+        """Candidate groups for `group` as (jaccard, group), most similar first"""
+        candidates = self.candidates(self.tags[group], group, limit)
+        candidates.discard(group)
+
+        mask, masks, members = self.masks[group], self.masks, self.members
+        scored = [
+            ((mask & masks[other]).bit_count() / (mask | masks[other]).bit_count(), other)
+            for other in candidates
+        ]
+        scored.sort(key=lambda candidate: (-candidate[0], members[candidate[1]][0]))
+        return scored
+
+    def neighbors(self, food_id: int, group: int, ranked: List[Tuple[float, int]], k: int = SIMILAR_TOP_K) -> Neighbors:
+        """Top k for one item: same-tag items first, then the ranked groups' members"""
+        result = [(other, 1.0) for other in islice((o for o in self.members[group] if o != food_id), k)]
+        for score, other in ranked:
+            if len(result) >= k:
+                break
+            result.extend((member, round(score, 4)) for member in islice(self.members[other], k - len(result)))
+        return result
+
+    def listing_candidates(self, food_id: int, mask: int, tag_ids: Iterable[int], k: int = SIMILAR_TOP_K) -> Set[int]:
+        """Items whose rows may list `food_id`, given the tags it had when they were built"""
+        suspects: Set[int] = set()
+        group = self.group_of.get(mask)
+        if group is not None and bisect_left(self.members[group], food_id) < k:
+            # Identical items list the first k of their group
+            suspects.update(self.members[group])
+        near = group if group is not None else 0
+        for other in self.candidates(tag_ids, near):
+            # Bigger groups are filled by their own identical items
+            if len(self.members[other]) <= k:
+                suspects.update(self.members[other])
+        return suspects
+
+
+def compute_all(snapshot: CatalogSnapshot, k: int = SIMILAR_TOP_K) -> Iterable[Tuple[int, Neighbors]]:
+    """(food id, neighbors) for every tagged item of a snapshot"""
+    index = TagIndex(snapshot.items)
+    for group, members in enumerate(index.members):
+        ranked = index.ranked(group)
+        for food_id in members:
+            yield food_id, index.neighbors(food_id, group, ranked, k)
+
+
+def tags_by_id(snapshot: CatalogSnapshot) -> TagsById:
+    """Each item's tags; shares the snapshot's mask and id-set objects rather than copying them"""
+    return {item.id: (item.tag_mask, item.tag_ids) for item in snapshot.items}
+
+
+def compute_changed(conn: Connection, snapshot: CatalogSnapshot, changed: Set[int],
+                    previous_tags: Optional[TagsById] = None,
+                    k: int = SIMILAR_TOP_K) -> Tuple[Dict[int, Neighbors], List[int]]:
+    """Rows to rewrite and rows to delete after `changed` items were written.
+
+    `previous_tags` are the item tags the stored rows were computed from;
+    without them, finding the rows that list a changed item takes a full scan.
+    """
+    index = TagIndex(snapshot.items)
+    by_id = snapshot.by_id
+    current = {food_id for food_id in changed if food_id in by_id}
+    # Changed items that had rows, i.e. were not just inserted
+    previous = read_rows(conn, snapshot.tenant, changed)
+
+    # Items that listed an item which has since changed or gone. Lists are not
+    # symmetric, so these are looked for among the items similar to its old tags.
+    affected = set(current)
+    if previous_tags is not None and all(food_id in previous_tags for food_id in previous):
+        suspects: Set[int] = set()
+        for food_id in previous:
+            mask, tag_ids = previous_tags[food_id]
+            suspects.update(index.listing_candidates(food_id, mask, tag_ids, k))
+        for food_id, neighbors in read_rows(conn, snapshot.tenant, suspects - affected).items():
+            if any(neighbor_id in previous for neighbor_id, _ in neighbors):
+                affected.add(food_id)
+    else:
+        # Old tags unknown: check every row. A substring test on the packed ids
+        # is cheap and a misaligned false match only costs a recompute.
+        needles = [array("I", [food_id]).tobytes() for food_id in previous]
+        rows = conn.execute(
+            select(FoodNeighbors.food_id, FoodNeighbors.neighbors).where(FoodNeighbors.tenant == snapshot.tenant)
+        )
+        for food_id, blob in rows:
+            ids = blob[:len(blob) // 6 * 4]
+            if food_id in by_id and any(needle in ids for needle in needles):
+                affected.add(food_id)
+
+    # Items a changed item may now outrank. Groups bigger than k are filled by
+    # their own identical items and cannot take it in.
+    ranked_cache: Dict[int, List[Tuple[float, int]]] = {}
+    contenders: Dict[int, float] = {}
+    for food_id in current:
+        group = index.group_of.get(by_id[food_id].tag_mask)
+        if group is None:
+            continue
+        ranked_cache[group] = index.ranked(group)
+        for score, other in ranked_cache[group]:
+            if len(index.members[other]) <= k:
+                for member in index.members[other]:
+                    contenders[member] = max(contenders.get(member, 0.0), round(score, 4))
+        if len(index.members[group]) <= k + 1:
+            affected.update(index.members[group])
+    for food_id, neighbors in read_rows(conn, snapshot.tenant, contenders.keys() - affected).items():
+        if len(neighbors) < k or neighbors[-1][1] <= contenders[food_id]:
+            affected.add(food_id)
+
+    rows = {}
+    for food_id in affected:
+        group = index.group_of.get(by_id[food_id].tag_mask)
+        if group is None:
+            rows[food_id] = []
+            continue
+        if group not in ranked_cache:
+            ranked_cache[group] = index.ranked(group)
+        rows[food_id] = index.neighbors(food_id, group, ranked_cache[group], k)
+    removed = [food_id for food_id in changed if food_id not in by_id]
+    return rows, removed
+
+
+def read_rows(conn: Connection, tenant: str, food_ids: Iterable[int]) -> Dict[int, Neighbors]:
+    food_ids = list(food_ids)
+    rows = {}
+    for start in range(0, len(food_ids), WRITE_CHUNK):
+        result = conn.execute(
+            select(FoodNeighbors.food_id, FoodNeighbors.neighbors).where(
+                FoodNeighbors.tenant == tenant,
+                FoodNeighbors.food_id.in_(food_ids[start:start + WRITE_CHUNK])
+            )
+        )
+        rows.update((food_id, unpack(blob)) for food_id, blob in result)
+    return rows
+
+
+def write_rows(conn: Connection, tenant: str, rows: Iterable[Tuple[int, Neighbors]],
+               removed: Iterable[int] = (), replace_all: bool = False):
+    if replace_all:
+        conn.execute(delete(FoodNeighbors).where(FoodNeighbors.tenant == tenant))
+    removed = list(removed)
+    if removed:
+        conn.execute(
+            delete(FoodNeighbors).where(FoodNeighbors.tenant == tenant, FoodNeighbors.food_id.in_(removed))
+        )
+    insert = text(
+        "INSERT OR REPLACE INTO food_neighbors (food_id, tenant, neighbors) VALUES (:food_id, :tenant, :neighbors)"
+    )
+    chunk = []
+    for food_id, neighbors in rows:
+        chunk.append({"food_id": food_id, "tenant": tenant, "neighbors": pack(neighbors)})
+        if len(chunk) >= WRITE_CHUNK:
+            conn.execute(insert, chunk)
+            chunk = []
+    if chunk:
+        conn.execute(insert, chunk)
+
+
+def set_built_version(conn: Connection, tenant: str, version: int):
+    conn.execute(
+        text("INSERT OR REPLACE INTO neighbor_versions (tenant, version) VALUES (:tenant, :version)"),
+        {"tenant": tenant, "version": version}
+    )
+
+
+def rebuild(snapshot: CatalogSnapshot):
+    """Recompute a tenant's whole table, swapped in with one transaction"""
+    rows = list(compute_all(snapshot))
+    with engine.begin() as conn:
+        write_rows(conn, snapshot.tenant, rows, replace_all=True)
+        set_built_version(conn, snapshot.tenant, snapshot.version)
+
+
+class NeighborTable:
+    """Reads neighbor rows, and brings them up to date with published snapshots.
+
+    Maintenance runs on its own background task, one tenant at a time, so a
+    long rebuild never holds up snapshot refreshes; the refresher only queues
+    the snapshots it publishes (notify).
+    """
+
+    def __init__(self):
+        # tenant -> (version, item tags) the stored rows were computed from; the
+        # tags outlive their snapshot so the next update can find who listed an item
+        self._synced: Dict[str, Tuple[int, TagsById]] = {}
+        self._rebuilt_at: Dict[str, float] = {}  # tenant -> last full rebuild (or first sync), monotonic
+        self._pending: Dict[str, CatalogSnapshot] = {}  # latest snapshot per tenant awaiting sync
+        self._lock = threading.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def get(self, conn: Connection, tenant: str, food_id: int) -> Optional[Neighbors]:
+        """Stored neighbors of an item, or None if its tenant's table has no row for it"""
+        blob = conn.execute(
+            select(FoodNeighbors.neighbors).where(FoodNeighbors.food_id == food_id, FoodNeighbors.tenant == tenant)
+        ).scalar()
+        return None if blob is None else unpack(blob)
+
+    def notify(self, snapshot: CatalogSnapshot):
+        """Queue a snapshot for maintenance unless its rows are current; cheap and thread-safe"""
+        with self._lock:
+            synced = self._synced.get(snapshot.tenant)
+            if synced is not None and synced[0] == snapshot.version:
+                return
+            self._pending[snapshot.tenant] = snapshot
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(self._wake.set)
+
+    async def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            while True:
+                with self._lock:
+                    if not self._pending:
+                        break
+                    _, snapshot = self._pending.popitem()
+                try:
+                    await self._loop.run_in_executor(None, self.sync, snapshot)
+                except Exception as e:
+                    print(f"Error updating similar items for {snapshot.tenant}: {e}")
+
+    def sync(self, snapshot: CatalogSnapshot):
+        """Apply the tenant's writes between the table's version and the snapshot's"""
+        with self._lock:
+            synced = self._synced.get(snapshot.tenant)
+            rebuilt_at = self._rebuilt_at.setdefault(snapshot.tenant, time.monotonic())
+        if synced is not None and synced[0] == snapshot.version:
+            return
+        small = len(snapshot.items) <= SIMILAR_AUTO_BUILD_MAX_ITEMS
+        due = small and time.monotonic() - rebuilt_at >= SIMILAR_REBUILD_INTERVAL
+
+        rows = None
+        with engine.connect() as conn:
+            built = conn.execute(
+                select(NeighborVersion.version).where(NeighborVersion.tenant == snapshot.tenant)
+            ).scalar()
+            current = built is not None and built >= snapshot.version
+            if built is not None and not current and not due:
+                feed = get_changes_since(conn, built, tenant=snapshot.tenant)
+                changed = {change["food_id"] for change in feed["changes"]}
+                if not feed["reset"] and len(changed) <= SIMILAR_INCREMENTAL_MAX:
+                    # Old tags are only known if the rows were built from our last snapshot
+                    previous = synced[1] if synced is not None and synced[0] == built else None
+                    rows, removed = compute_changed(conn, snapshot, changed, previous)
+
+        if current:
+            pass
+        elif rows is not None:
+            with engine.begin() as conn:
+                write_rows(conn, snapshot.tenant, rows.items(), removed)
+                set_built_version(conn, snapshot.tenant, snapshot.version)
+        elif small:
+            rebuild(snapshot)
+            with self._lock:
+                self._rebuilt_at[snapshot.tenant] = time.monotonic()
+        else:
+            print(f"Similar-item table for {snapshot.tenant} is stale; "
+                  f"rebuild it offline with `python similarity.py --tenant {snapshot.tenant}`")
+        with self._lock:
+            self._synced[snapshot.tenant] = (snapshot.version, tags_by_id(snapshot))
+
+
+neighbor_table = NeighborTable()
+
+
+def verify(conn: Connection, snapshot: CatalogSnapshot) -> List[int]:
+    """Items whose stored row differs from what a rebuild of `snapshot` would store"""
+    expected = dict(compute_all(snapshot))
+    stored = {
+        food_id: unpack(blob) for food_id, blob in conn.execute(
+            select(FoodNeighbors.food_id, FoodNeighbors.neighbors).where(FoodNeighbors.tenant == snapshot.tenant)
+        )
+    }
+    return sorted(food_id for food_id in expected.keys() | stored.keys() if expected.get(food_id) != stored.get(food_id))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tenant", action="append", help="tenant to rebuild (repeatable; default all)")
+    parser.add_argument("--verify", action="store_true",
+                        help="compare stored rows with a rebuild instead of rebuilding; exits 1 on differences")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    differing = 0
+    try:
+        tenants = args.tenant or db.execute(select(TenantVersion.tenant)).scalars().all()
+        for tenant in tenants:
+            snapshot = load_snapshot(db, tenant)
+            db.rollback()
+            if args.verify:
+                built = db.execute(select(NeighborVersion.version).where(NeighborVersion.tenant == tenant)).scalar()
+                mismatched = verify(db.connection(), snapshot)
+                db.rollback()
+                differing += len(mismatched)
+                print(f"{tenant}: {len(mismatched)} of {len(snapshot.items)} rows differ from a rebuild "
+                      f"(table at version {built}, catalog at {snapshot.version})"
+                      + (f": {', '.join(map(str, mismatched[:20]))}" if mismatched else ""))
+                continue
+            started = time.perf_counter()
+            rebuild(snapshot)
+            size = db.execute(
+                text("SELECT COUNT(*), COALESCE(SUM(LENGTH(neighbors)), 0) FROM food_neighbors WHERE tenant = :tenant"),
+                {"tenant": tenant}
+            ).one()
+            print(f"{tenant}: {len(snapshot.items)} items, {size[0]} rows ({size[1] / 1024 / 1024:.1f} MB of neighbors) "
+                  f"in {time.perf_counter() - started:.1f}s (snapshot load {snapshot.load_ms / 1000:.1f}s)")
+    finally:
+        db.close()
+    if differing:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
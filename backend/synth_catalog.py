@@ -0,0 +1,175 @@
+"""Deterministic synthetic catalog generator for scale testing.
+
+Usage:
+    python synth_catalog.py --count 1000000 --database /tmp/food_1m.db
+    python synth_catalog.py --count 100000 --ndjson /tmp/food_100k.ndjson
+    python synth_catalog.py --count 50000 --seed 7 --tenant pune --database /tmp/food_1m.db
+
+Items are variations of the seed catalog: each picks a cuisine (weighted like
+FOOD_ITEMS), keeps most of a template item's tags and adds a few more drawn
+from that cuisine's tag frequencies. The same --seed always yields the same
+catalog. SQLite output is bulk-loaded with the change feed and search
+triggers detached, then the search index is rebuilt and the change feed is
+reset so running workers reload in full.
+"""
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import time
+from collections import Counter, defaultdict
+from typing import Dict, Iterator, List
+
+from sqlalchemy import create_engine
+
+from changefeed import install_change_feed, reset_change_feed
+from database import Base
+from dietary import install_claims_column
+from search import install_search_index, rebuild_search_index
+from seed_data import FOOD_ITEMS
+from tenants import DEFAULT_TENANT, install_tenant_column
+
+CHUNK_SIZE = 50000
+
+VARIANTS = [
+    "Classic", "Spicy", "Loaded", "Mini", "Jumbo", "Homestyle", "Street-Style",
+    "Smoky", "Crispy", "Double", "Tandoori", "Masala", "Royal", "Signature",
+    "Zesty", "Garlic", "Cheesy", "Herb", "Midnight", "Express",
+]
+
+LEVEL_PREFIXES = {"spice", "budget", "hunger"}
+
+COLUMNS = [
+    "name", "emoji", "cuisine", "tags", "avg_price", "description",
+    "spice_level", "is_vegetarian", "serving_size", "temperature",
+]
+
+
+def build_distributions():
+    """Cuisine weights, template items and tag frequencies per cuisine from the seed data"""
+    templates: Dict[str, List[dict]] = defaultdict(list)
+    tag_counts: Dict[str, Counter] = defaultdict(Counter)
+    for item in FOOD_ITEMS:
+        templates[item["cuisine"]].append(item)
+        tag_counts[item["cuisine"]].update(item["tags"])
+
+    cuisines = list(templates)
+    cuisine_weights = [len(templates[cuisine]) for cuisine in cuisines]
+    tag_pools = {
+        cuisine: (list(counts), list(counts.values()))
+        for cuisine, counts in tag_counts.items()
+    }
+    return cuisines, cuisine_weights, templates, tag_pools
+
+
+def generate_items(count: int, seed: int = 42) -> Iterator[dict]:
+    """Yield `count` synthetic food items; deterministic for a given seed"""
+    rng = random.Random(seed)
+    cuisines, cuisine_weights, templates, tag_pools = build_distributions()
+
+    for index in range(count):
+        cuisine = rng.choices(cuisines, cuisine_weights)[0]
+        template = rng.choice(templates[cuisine])
+        pool, weights = tag_pools[cuisine]
+
+        tags = [tag for tag in template["tags"] if rng.random() < 0.85]
+        for tag in rng.choices(pool, weights, k=rng.randint(0, 3)):
+            # spice_/budget_/hunger_ tags are one-per-item levels, not extra flavour
+            if tag.split("_")[0] not in LEVEL_PREFIXES:
+                tags.append(tag)
+        spice_level = min(5, max(0, template["spice_level"] + rng.choice([-1, 0, 0, 1])))
+
+        yield {
+            "name": f"{rng.choice(VARIANTS)} {template['name']} #{index + 1}",
+            "emoji": template["emoji"],
+            "cuisine": cuisine,
+            "tags": list(dict.fromkeys(tags)),
+            "avg_price": max(20, int(template["avg_price"] * rng.uniform(0.6, 1.6))),
+            "description": template["description"],
+            "spice_level": spice_level,
+            "is_vegetarian": template["is_vegetarian"],
+            "serving_size": template["serving_size"],
+            "temperature": template["temperature"],
+        }
+
+
+def write_sqlite(path: str, count: int, seed: int, tenant: str = DEFAULT_TENANT, chunk_size: int = CHUNK_SIZE):
+    """Bulk-load items for one tenant into a SQLite database (created if missing)"""
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    install_tenant_column(engine)
+    install_claims_column(engine)
+    install_change_feed(engine)
+    install_search_index(engine)
+
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=OFF")
+
+    # Detach per-row triggers for the load; both indexes are rebuilt afterwards
+    triggers = conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'food_items'"
+    ).fetchall()
+    for (name,) in triggers:
+        conn.execute(f"DROP TRIGGER {name}")
+
+    insert = (
+        f"INSERT INTO food_items ({', '.join(COLUMNS)}, tenant) "
+        f"VALUES ({', '.join('?' * (len(COLUMNS) + 1))})"
+    )
+    started = time.perf_counter()
+    written = 0
+    chunk = []
+    with conn:
+        for item in generate_items(count, seed):
+            item["tags"] = json.dumps(item["tags"])
+            chunk.append((*(item[column] for column in COLUMNS), tenant))
+            if len(chunk) >= chunk_size:
+                conn.executemany(insert, chunk)
+                written += len(chunk)
+                chunk = []
+                print(f"  {written}/{count} rows ({written / (time.perf_counter() - started):.0f} rows/s)", file=sys.stderr)
+        if chunk:
+            conn.executemany(insert, chunk)
+            written += len(chunk)
+    conn.close()
+    load_seconds = time.perf_counter() - started
+
+    install_change_feed(engine)
+    install_search_index(engine)
+    rebuild_search_index(engine)
+    reset_change_feed(engine)
+    engine.dispose()
+
+    print(f"Wrote {written} items for tenant {tenant} to {path} in {load_seconds:.1f}s "
+          f"(index rebuild {time.perf_counter() - started - load_seconds:.1f}s)")
+
+
+def write_ndjson(path: str, count: int, seed: int):
+    """Write items as NDJSON, accepted by POST /api/admin/foods/bulk"""
+    with open(path, "w") as out:
+        for item in generate_items(count, seed):
+            out.write(json.dumps(item))
+            out.write("\n")
+    print(f"Wrote {count} items to {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, required=True, help="number of items to generate")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--tenant", default=DEFAULT_TENANT, help="tenant the SQLite rows belong to")
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument("--database", help="SQLite file to load into")
+    target.add_argument("--ndjson", help="NDJSON snapshot file to write")
+    args = parser.parse_args()
+
+    if args.database:
+        write_sqlite(args.database, args.count, args.seed, args.tenant)
+    else:
+        write_ndjson(args.ndjson, args.count, args.seed)
+
+
+if __name__ == "__main__":
+    main()
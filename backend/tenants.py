@@ -0,0 +1,39 @@
+import os
+import re
+from typing import Optional
+
+from fastapi import Header, HTTPException
+from sqlalchemy.engine import Engine
+
+TENANT_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,49}$")
+
+# Catalog served when a request names no tenant (rows created before tenants existed live here)
+DEFAULT_TENANT = os.getenv("DEFAULT_TENANT", "default")
+if not TENANT_PATTERN.match(DEFAULT_TENANT):
+    # Also used as a SQL column default, so it must be a plain tenant name
+    raise ValueError(f"DEFAULT_TENANT must match {TENANT_PATTERN.pattern}, got {DEFAULT_TENANT!r}")
+
+
+def install_tenant_column(engine: Engine):
+    """Add food_items.tenant to databases created before tenants existed"""
+    with engine.begin() as conn:
+        columns = [row[1] for row in conn.exec_driver_sql("PRAGMA table_info(food_items)")]
+        if "tenant" not in columns:
+            conn.exec_driver_sql(
+                f"ALTER TABLE food_items ADD COLUMN tenant VARCHAR(50) NOT NULL DEFAULT '{DEFAULT_TENANT}'"
+            )
+        conn.exec_driver_sql("CREATE INDEX IF NOT EXISTS ix_food_items_tenant ON food_items (tenant)")
+
+
+def get_tenant(x_tenant: Optional[str] = Header(None)) -> str:
+    """Dependency: the tenant (city / restaurant catalog) a request is for, from X-Tenant"""
+    if x_tenant is None:
+        return DEFAULT_TENANT
+    tenant = x_tenant.strip().lower()
+    if not TENANT_PATTERN.match(tenant):
+        raise HTTPException(
+            status_code=400,
+            detail="X-Tenant must be 1-50 characters of a-z, 0-9, '_' or '-'"
+        )
+    return tenant
+
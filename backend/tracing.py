@@ -0,0 +1,295 @@
+import asyncio
+import contextvars
+import json
+import os
+import random
+import time
+import urllib.request
+from typing import List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+
+from database import SessionLocal
+
+# Opt-in: with tracing off no middleware or dependency override is installed and
+# span() returns a shared no-op, so the request path does no tracing work at all
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "0") == "1"
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.1"))  # fraction of requests traced
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "traces.jsonl")
+# OTLP/HTTP JSON collector, e.g. http://localhost:4318/v1/traces; replaces the file when set
+TRACE_OTLP_ENDPOINT = os.getenv("TRACE_OTLP_ENDPOINT", "")
+TRACE_QUEUE_MAXSIZE = int(os.getenv("TRACE_QUEUE_MAXSIZE", "10000"))  # finished traces
+TRACE_BATCH_SIZE = int(os.getenv("TRACE_BATCH_SIZE", "256"))
+TRACE_FLUSH_INTERVAL = float(os.getenv("TRACE_FLUSH_INTERVAL", "2.0"))  # seconds
+
+SERVICE_NAME = "what-should-i-eat-api"
+
+# Trace and innermost open span of the current request, set by TracingMiddleware.
+# Context variables follow the request into threadpool endpoints and dependencies.
+_trace: contextvars.ContextVar[Optional["Trace"]] = contextvars.ContextVar("trace", default=None)
+_parent: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("parent_span", default=None)
+
+
+def _span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Trace:
+    """Finished spans of one sampled request, as OTLP JSON span dicts"""
+
+    def __init__(self, trace_id: Optional[str] = None):
+        self.trace_id = trace_id or f"{random.getrandbits(128):032x}"
+        self.spans: List[dict] = []
+
+
+class Span:
+    """Timed child of the current span; use as a context manager"""
+
+    def __init__(self, trace: Trace, name: str, kind: int = 1):
+        self.trace = trace
+        self.name = name
+        self.kind = kind  # OTLP SpanKind: 1 internal, 2 server
+        self.span_id = _span_id()
+        self.attributes = {}
+
+    def set(self, key: str, value):
+        self.attributes[key] = value
+
+    def __enter__(self):
+        self.parent_id = _parent.get()
+        self._token = _parent.set(self.span_id)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end_ns = time.time_ns()
+        _parent.reset(self._token)
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        # list.append is atomic, so spans may finish in any thread
+        self.trace.spans.append(_otlp_span(
+            self.trace.trace_id, self.span_id, self.parent_id, self.name, self.kind,
+            self.start_ns, end_ns, self.attributes,
+        ))
+        return False
+
+
+class _NoopSpan:
+    def set(self, key: str, value):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+def span(name: str):
+    """Child span of the current request's trace; a shared no-op when it is not traced"""
+    trace = _trace.get()
+    if trace is None:
+        return _NOOP_SPAN
+    return Span(trace, name)
+
+
+def _otlp_span(trace_id, span_id, parent_id, name, kind, start_ns, end_ns, attributes) -> dict:
+    record = {
+        "traceId": trace_id,
+        "spanId": span_id,
+        "name": name,
+        "kind": kind,
+        "startTimeUnixNano": str(start_ns),
+        "endTimeUnixNano": str(end_ns),
+        "attributes": [
+            {"key": key, "value": {"intValue": str(value)} if isinstance(value, int) else {"stringValue": str(value)}}
+            for key, value in attributes.items()
+        ],
+    }
+    if parent_id is not None:
+        record["parentSpanId"] = parent_id
+    return record
+
+
+def parse_traceparent(header: Optional[str]):
+    """(trace id, parent span id, sampled) from a W3C traceparent header, or None"""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        sampled = int(parts[3], 16) & 1
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(sampled)
+
+
+class SpanExporter:
+    """Bounded queue of finished traces, written out in batches off the request path"""
+
+    def __init__(self, path: str = TRACE_EXPORT_PATH, endpoint: str = TRACE_OTLP_ENDPOINT,
+                 maxsize: int = TRACE_QUEUE_MAXSIZE, batch_size: int = TRACE_BATCH_SIZE,
+                 flush_interval: float = TRACE_FLUSH_INTERVAL):
+        self.path = path
+        self.endpoint = endpoint
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._batch: List[List[dict]] = []
+
+        self.exported = 0
+        self.dropped = 0
+        self.failed = 0
+        self.batches = 0
+
+    def submit(self, trace: Trace) -> bool:
+        """Enqueue a finished trace without blocking; dropped when the queue is full"""
+        if self.queue is None:
+            self.dropped += 1
+            return False
+        try:
+            self.queue.put_nowait(trace.spans)
+        except asyncio.QueueFull:
+            self.dropped += 1
+            return False
+        return True
+
+    async def start(self):
+        self.queue = asyncio.Queue(maxsize=self.maxsize)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the export task and write out whatever is still queued"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.queue is not None:
+            # Include the batch the task was still gathering when cancelled
+            batch, self._batch = self._batch, []
+            while not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if batch:
+                self.export(batch)
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # Block for the first trace, then gather more until the batch is
+            # full or the flush interval has passed
+            self._batch = batch = [await self.queue.get()]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            self._batch = []
+            try:
+                await loop.run_in_executor(None, self.export, batch)
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"Error exporting trace batch: {e}")
+
+    def export(self, batch: List[List[dict]]):
+        """Send a batch as one OTLP/JSON ExportTraceServiceRequest (one line in the file)"""
+        payload = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "tracing"},
+                    "spans": [record for spans in batch for record in spans],
+                }],
+            }],
+        }, separators=(",", ":"))
+        if self.endpoint:
+            request = urllib.request.Request(
+                self.endpoint, data=payload.encode(), headers={"Content-Type": "application/json"}
+            )
+            with urllib.request.urlopen(request, timeout=5):
+                pass
+        else:
+            with open(self.path, "a") as out:
+                out.write(payload + "\n")
+        self.exported += len(batch)
+        self.batches += 1
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queue.qsize() if self.queue is not None else 0,
+            "exported": self.exported,
+            "dropped": self.dropped,
+            "failed": self.failed,
+            "batches": self.batches,
+        }
+
+
+span_exporter = SpanExporter()
+
+
+class TracingMiddleware:
+    """Root span per sampled HTTP request; the trace id is returned in X-Trace-Id.
+
+    A W3C traceparent header from the caller decides sampling and links the
+    trace to the caller's; otherwise TRACE_SAMPLE_RATE of requests are traced.
+    """
+
+    def __init__(self, app, sample_rate: float = TRACE_SAMPLE_RATE, exporter: SpanExporter = span_exporter):
+        self.app = app
+        self.sample_rate = sample_rate
+        self.exporter = exporter
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        incoming = parse_traceparent(Headers(scope=scope).get("traceparent"))
+        sampled = incoming[2] if incoming else random.random() < self.sample_rate
+        if not sampled:
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(incoming[0] if incoming else None)
+        root = Span(trace, f"{scope['method']} {scope['path']}", kind=2)
+        root.set("http.method", scope["method"])
+        root.set("http.target", scope["path"])
+        trace_token = _trace.set(trace)
+        # Root's parent is the caller's span, if any
+        parent_token = _parent.set(incoming[1] if incoming else None)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set("http.status_code", message["status"])
+                MutableHeaders(scope=message)["X-Trace-Id"] = trace.trace_id
+            await send(message)
+
+        try:
+            with root:
+                await self.app(scope, receive, send_wrapper)
+        finally:
+            _parent.reset(parent_token)
+            _trace.reset(trace_token)
+            self.exporter.submit(trace)
+
+
+def traced_get_db():
+    """get_db with a span for opening the session and one for closing it"""
+    with span("get_db"):
+        db = SessionLocal()
+    try:
+        yield db
+    finally:
+        with span("get_db.close"):
+            db.close()
@@ -0,0 +1,93 @@
+import os
+import sys
+import threading
+from typing import Dict, FrozenSet, Iterable, List
+
+# Distinct tags given an id of their own. Ids are never reused (masks in live
+# snapshots refer to them), so past this every new tag shares one overflow id
+# rather than widening every mask forever as catalogs churn.
+VOCABULARY_MAX_TAGS = int(os.getenv("VOCABULARY_MAX_TAGS", "65536"))
+OVERFLOW_TAG = "~other"
+
+
+class TagVocabulary:
+    """Process-wide tag interning: each lowercased tag gets a stable small integer id.
+
+    Tag sets are represented as frozensets of ids or as int bitmasks (bit i set
+    for tag id i), so matching is an intersection/AND plus a popcount instead of
+    repeated string lowering and hashing.
+    """
+
+    def __init__(self, max_tags: int = VOCABULARY_MAX_TAGS):
+        self.max_tags = max(max_tags, 2)
+        self._ids: Dict[str, int] = {}
+        self._names: List[str] = []
+        self._lock = threading.Lock()
+        self.overflowed = 0  # lookups of tags that got the overflow id
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def intern(self, tag: str) -> int:
+        tag_id = self._ids.get(tag)
+        if tag_id is not None:
+            return tag_id
+        name = tag.lower()
+        with self._lock:
+            tag_id = self._ids.get(name)
+            if tag_id is None:
+                if len(self._names) >= self.max_tags - 1:
+                    # Full: not remembered, so lookups of unknown tags cannot grow it either
+                    self.overflowed += 1
+                    if self.overflowed == 1:
+                        print(f"Tag vocabulary is full ({self.max_tags} tags); new tags now share one id. "
+                              f"Raise VOCABULARY_MAX_TAGS and restart to tell them apart.")
+                    return self._overflow_id()
+                name = sys.intern(name)
+                tag_id = len(self._names)
+                self._names.append(name)
+                self._ids[name] = tag_id
+            # Also remember the original spelling so the next lookup is a single dict hit,
+            # while spellings stay bounded too
+            if len(self._ids) < 2 * self.max_tags:
+                self._ids.setdefault(tag, tag_id)
+        return tag_id
+
+    def _overflow_id(self) -> int:
+        # Called under the lock; takes the last id the first time it is needed
+        tag_id = self._ids.get(OVERFLOW_TAG)
+        if tag_id is None:
+            tag_id = len(self._names)
+            self._names.append(OVERFLOW_TAG)
+            self._ids[OVERFLOW_TAG] = tag_id
+        return tag_id
+
+    def name(self, tag_id: int) -> str:
+        return self._names[tag_id]
+
+    def canonical(self, tag: str) -> str:
+        """The lowercased tag, as the vocabulary's shared string when it has an id of its own"""
+        name = self._names[self.intern(tag)]
+        return tag.lower() if name == OVERFLOW_TAG else name
+
+    def id_set(self, tags: Iterable[str]) -> FrozenSet[int]:
+        return frozenset(self.intern(tag) for tag in tags)
+
+    def mask(self, tags: Iterable[str]) -> int:
+        mask = 0
+        for tag in tags:
+            mask |= 1 << self.intern(tag)
+        return mask
+
+    def names(self, mask: int) -> List[str]:
+        """Tag names for the bits set in `mask`, in tag-id order"""
+        names = []
+        while mask:
+            low_bit = mask & -mask
+            names.append(self._names[low_bit.bit_length() - 1])
+            mask ^= low_bit
+        return names
+
+
+# Shared vocabulary for the quiz table and every catalog snapshot
+vocabulary = TagVocabulary()
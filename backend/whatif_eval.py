@@ -0,0 +1,295 @@
+"""Offline what-if evaluation: replay quiz answers through two recommenders and compare rankings.
+
+Usage:
+    python whatif_eval.py --log quiz_log.jsonl --baseline /tmp/recommendation_old.py:score_foods
+    python whatif_eval.py --synthetic 200000 --baseline old_rec.py:score_foods --workers 8
+
+A recommender is `module:function` or `path/to/file.py:function`, called like
+recommendation.score_foods(foods, answers) and returning (food, score, ...)
+tuples. Rankings follow get_recommendations: dietary filters, then a stable
+sort by score. To compare against the last commit:
+
+    git show HEAD:backend/recommendation.py > /tmp/recommendation_old.py
+
+Each log line is a QuizAnswers object, or a record with it under "answers".
+The catalog snapshot is loaded once before the worker pool forks, so workers
+share it read-only. DATABASE_URL is opened read-only and never migrated: start
+the API against an older database once before evaluating it. Scoring runs
+without feedback boosts or request context, which makes runs repeatable.
+"""
+import argparse
+import importlib
+import importlib.util
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+
+from catalog import CatalogSnapshot, load_snapshot
+from database import DATABASE_URL
+from dietary import select
+from schemas import QuizAnswers
+from tenants import DEFAULT_TENANT
+
+SCORE_BINS = 101  # one bin per score point, 0-100
+
+# Set in the parent before the pool starts (inherited on fork) or by _init_worker
+_catalog: Optional[CatalogSnapshot] = None
+_recommenders: Optional[List[Callable]] = None
+
+
+def load_recommender(spec: str) -> Callable:
+    """Resolve "module:function" or "path/to/file.py:function" """
+    target, _, function = spec.rpartition(":")
+    if not target or not function:
+        raise ValueError(f"Expected module:function or file.py:function, got {spec!r}")
+    if target.endswith(".py"):
+        name = f"whatif_{abs(hash(os.path.abspath(target)))}"
+        module_spec = importlib.util.spec_from_file_location(name, target)
+        module = importlib.util.module_from_spec(module_spec)
+        sys.modules[name] = module
+        module_spec.loader.exec_module(module)
+    else:
+        module = importlib.import_module(target)
+    return getattr(module, function)
+
+
+def read_only_url(url: str) -> str:
+    """A SQLite DATABASE_URL as a read-only URI, so evaluating can never write to the catalog"""
+    parsed = make_url(url)
+    if parsed.get_backend_name() != "sqlite" or not parsed.database or parsed.database == ":memory:":
+        raise ValueError(f"Expected a SQLite database file, got {url!r}")
+    return f"sqlite:///file:{os.path.abspath(parsed.database)}?mode=ro&uri=true"
+
+
+def open_catalog(url: str, tenant: str) -> CatalogSnapshot:
+    """Load a tenant's snapshot from a read-only connection, after checking the schema is current"""
+    engine = create_engine(read_only_url(url))
+    try:
+        with engine.connect() as conn:
+            tables = {row[0] for row in conn.exec_driver_sql("SELECT name FROM sqlite_master WHERE type = 'table'")}
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(food_items)")}
+        missing = sorted({"food_items", "tenant_versions"} - tables)
+        missing += [f"food_items.{column}" for column in sorted({"tenant", "claims"} - columns) if columns]
+        if missing:
+            raise ValueError(
+                f"{url} has an older schema (missing {', '.join(missing)}). "
+                f"Start the API against it once to migrate it, then evaluate again."
+            )
+        with Session(engine) as db:
+            return load_snapshot(db, tenant)
+    finally:
+        engine.dispose()
+
+
+def _init_worker(specs: List[str], url: str, tenant: str):
+    global _catalog, _recommenders
+    if _recommenders is None:
+        _recommenders = [load_recommender(spec) for spec in specs]
+    if _catalog is None:
+        _catalog = open_catalog(url, tenant)
+
+
+def rank(score_foods: Callable, catalog: CatalogSnapshot, answers: QuizAnswers, top: int) -> List[tuple]:
+    """Top (food id, score) pairs the way get_recommendations orders them"""
+    mask = catalog.dietary.mask(answers)
+    foods = catalog.items if mask is None else select(catalog.items, mask)
+    scored = sorted(score_foods(foods, answers), key=lambda result: result[1], reverse=True)
+    return [(result[0].id, result[1]) for result in scored[:top]]
+
+
+def empty_stats() -> dict:
+    return {
+        "evaluated": 0,
+        "overlap": 0.0,  # sum of |A ∩ B| / max(|A|, |B|)
+        "jaccard": 0.0,
+        "top1_agree": 0,
+        "top1_delta": 0.0,  # sum of |score A - score B| at rank 1
+        "recommenders": [
+            {"no_match": 0, "items": Counter(), "top1_scores": [0] * SCORE_BINS}
+            for _ in range(2)
+        ],
+    }
+
+
+def evaluate_chunk(lines: List[str], top: int) -> dict:
+    """Worker: run both recommenders over a chunk of log lines"""
+    stats = empty_stats()
+    stats["invalid"] = 0
+    for line in lines:
+        try:
+            record = json.loads(line)
+            answers = QuizAnswers.model_validate(record.get("answers", record))
+        except (ValueError, ValidationError, AttributeError):
+            stats["invalid"] += 1
+            continue
+
+        rankings = [rank(score_foods, _catalog, answers, top) for score_foods in _recommenders]
+        for ranking, recommender in zip(rankings, stats["recommenders"]):
+            if not ranking:
+                recommender["no_match"] += 1
+                continue
+            recommender["items"].update(food_id for food_id, _ in ranking)
+            recommender["top1_scores"][min(max(int(ranking[0][1]), 0), SCORE_BINS - 1)] += 1
+
+        baseline, candidate = ({food_id for food_id, _ in ranking} for ranking in rankings)
+        stats["evaluated"] += 1
+        union = baseline | candidate
+        # Both recommenders finding nothing counts as full agreement; a filter
+        # leaving fewer than `top` items does not count against identical lists
+        stats["overlap"] += len(baseline & candidate) / max(len(baseline), len(candidate)) if union else 1.0
+        stats["jaccard"] += len(baseline & candidate) / len(union) if union else 1.0
+        if rankings[0] and rankings[1]:
+            stats["top1_agree"] += rankings[0][0][0] == rankings[1][0][0]
+            stats["top1_delta"] += abs(rankings[0][0][1] - rankings[1][0][1])
+        elif not rankings[0] and not rankings[1]:
+            stats["top1_agree"] += 1
+    return stats
+
+
+def merge(total: dict, part: dict):
+    for key in ("evaluated", "overlap", "jaccard", "top1_agree", "top1_delta", "invalid"):
+        total[key] = total.get(key, 0) + part[key]
+    for mine, theirs in zip(total["recommenders"], part["recommenders"]):
+        mine["no_match"] += theirs["no_match"]
+        mine["items"].update(theirs["items"])
+        mine["top1_scores"] = [a + b for a, b in zip(mine["top1_scores"], theirs["top1_scores"])]
+
+
+def histogram_percentile(histogram: List[int], pct: float) -> int:
+    target = sum(histogram) * pct / 100
+    running = 0
+    for score, count in enumerate(histogram):
+        running += count
+        if count and running >= target:
+            return score
+    return 0
+
+
+def read_log(path: str) -> Iterator[str]:
+    with open(path) as log:
+        for line in log:
+            if line.strip():
+                yield line
+
+
+def synthetic_log(count: int, seed: int = 42) -> Iterator[str]:
+    rng = random.Random(seed)
+    for _ in range(count):
+        yield json.dumps({
+            "hunger": rng.randint(0, 100),
+            "budget": rng.choice(["broke", "moderate", "balling"]),
+            "healthiness": rng.randint(0, 100),
+            "temperature": rng.randint(0, 100),
+            "spice": rng.randint(0, 5),
+            "social": rng.choice(["solo", "date", "group"]),
+            "vibe": rng.choice(["hangover", "stressed", "lazy", "happy"]),
+            "vegetarian": rng.random() < 0.2,
+        })
+
+
+def chunks(lines: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(lines)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def run(lines: Iterable[str], specs: List[str], tenant: str, top: int, workers: int, chunk_size: int,
+        url: str = DATABASE_URL) -> dict:
+    global _catalog, _recommenders
+    _recommenders = [load_recommender(spec) for spec in specs]
+    _catalog = open_catalog(url, tenant)
+
+    total = empty_stats()
+    started = time.perf_counter()
+    if workers <= 1:
+        for chunk in chunks(lines, chunk_size):
+            merge(total, evaluate_chunk(chunk, top))
+    else:
+        # fork shares the loaded catalog copy-on-write; elsewhere workers load their own
+        methods = multiprocessing.get_all_start_methods()
+        context = multiprocessing.get_context("fork" if "fork" in methods else None)
+        with ProcessPoolExecutor(workers, mp_context=context, initializer=_init_worker,
+                                 initargs=(specs, url, tenant)) as pool:
+            # Keep a bounded number of chunks in flight so huge logs stream through
+            pending = set()
+            for chunk in chunks(lines, chunk_size):
+                pending.add(pool.submit(evaluate_chunk, chunk, top))
+                if len(pending) >= workers * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        merge(total, future.result())
+            for future in pending:
+                merge(total, future.result())
+    total["seconds"] = time.perf_counter() - started
+    total["catalog_items"] = len(_catalog.items)
+    return total
+
+
+def report(total: dict, specs: List[str], top: int):
+    evaluated = total["evaluated"] or 1
+    seconds = total["seconds"] or 1e-9
+    print(f"Evaluated {total['evaluated']} quizzes against {total['catalog_items']} items "
+          f"in {seconds:.2f}s ({total['evaluated'] / seconds:.0f} quizzes/s, "
+          f"{2 * total['evaluated'] / seconds:.0f} evaluations/s); {total.get('invalid', 0)} invalid lines")
+    print(f"  overlap@{top}        {total['overlap'] / evaluated:.3f}")
+    print(f"  jaccard@{top}        {total['jaccard'] / evaluated:.3f}")
+    print(f"  top-1 agreement   {total['top1_agree'] / evaluated:.3f}")
+    print(f"  top-1 |score diff| {total['top1_delta'] / evaluated:.2f}")
+    for label, spec, stats in zip(("baseline", "candidate"), specs, total["recommenders"]):
+        histogram = stats["top1_scores"]
+        matched = sum(histogram) or 1
+        mean = sum(score * count for score, count in enumerate(histogram)) / matched
+        print(f"{label}: {spec}")
+        print(f"  coverage@{top}       {len(stats['items'])}/{total['catalog_items']} items "
+              f"({len(stats['items']) / max(total['catalog_items'], 1):.1%})")
+        print(f"  no match          {stats['no_match'] / evaluated:.1%}")
+        print(f"  top-1 score       mean {mean:.1f}  p10 {histogram_percentile(histogram, 10)}  "
+              f"p50 {histogram_percentile(histogram, 50)}  p90 {histogram_percentile(histogram, 90)}")
+        print(f"  top items         {', '.join(f'{food_id}x{count}' for food_id, count in stats['items'].most_common(5))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", help="JSONL file of quiz answers")
+    source.add_argument("--synthetic", type=int, help="replay N random quizzes instead of a log")
+    parser.add_argument("--baseline", required=True, help="old recommender, module:function or file.py:function")
+    parser.add_argument("--candidate", default="recommendation:score_foods", help="new recommender")
+    parser.add_argument("--tenant", default=DEFAULT_TENANT)
+    parser.add_argument("--top", type=int, default=3, help="ranking depth compared (the API returns 3)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=2000, help="quizzes per task")
+    parser.add_argument("--json", action="store_true", help="print raw totals as JSON")
+    args = parser.parse_args()
+
+    specs = [args.baseline, args.candidate]
+    lines = read_log(args.log) if args.log else synthetic_log(args.synthetic)
+    try:
+        total = run(lines, specs, args.tenant, args.top, args.workers, args.chunk_size)
+    except ValueError as e:
+        parser.exit(1, f"whatif_eval: {e}\n")
+    if args.json:
+        for stats in total["recommenders"]:
+            stats["coverage"] = len(stats.pop("items"))
+        print(json.dumps(total))
+    else:
+        report(total, specs, args.top)
+
+
+if __name__ == "__main__":
+    main()
@@ -20,11 +20,13 @@ interface FoodResult {
 interface RecommendationResponse {
   best_match: FoodResult;
   score: number;
-  matched_tags: string[];
+  matched_count: number;
+  matched_tags?: string[];
   alternatives: Array<{
     food: FoodResult;
     score: number;
-    matched_tags: string[];
+    matched_count: number;
+    matched_tags?: string[];
   }>;
   total_matches: number;
 }
@@ -49,10 +51,11 @@ export const ResultsScreen = ({ answers, onRestart }: ResultsScreenProps) => {
   useEffect(() => {
     const fetchRecommendation = async () => {
       try {
-        const response = await fetch(`${API_URL}/api/recommend`, {
+        const response = await fetch(`${API_URL}/api/recommend?explain=true`, {
           method: "POST",
           headers: {
             "Content-Type": "application/json",
+            "X-Timezone": Intl.DateTimeFormat().resolvedOptions().timeZone,
           },
           body: JSON.stringify(answers),
         });
@@ -67,7 +70,7 @@ export const ResultsScreen = ({ answers, onRestart }: ResultsScreenProps) => {
         setTimeout(() => {
           setResult(data.best_match);
           setScore(data.score);
-          setMatchedTags(data.matched_tags);
+          setMatchedTags(data.matched_tags ?? []);
           setLoading(false);
         }, 2000);
         